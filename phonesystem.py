@@ -1,36 +1,92 @@
-import RPi.GPIO as GPIO
 import time
 import requests
-import pyaudio
+import requests.adapters
 import wave
 import speech_recognition as sr
 import subprocess
 import os
+import sys
 import math
-import struct
 import random
 import threading
+import queue
+import json
+import re
+import hashlib
+from collections import OrderedDict, deque
 from datetime import datetime
 import webrtcvad  # NEW: pip install webrtcvad
+import numpy as np
 
 # GPIO Setup
 ROTARY_PIN = 17
 HOOK_PIN = 27
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(ROTARY_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(HOOK_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+# Hardware backend: "pi" for the real phone, "sim" for the simulated phone
+# (scripted hook/dial timeline and file-backed audio devices)
+HARDWARE_BACKEND = "pi"
+SIM_OUTPUT_DIR = "/tmp/phone-sim"
+
+# Dial decoder timing (seconds)
+EDGE_DEBOUNCE = 0.005      # contact bounce settles within this window
+HOOK_DEBOUNCE = 0.03
+PULSE_MIN_WIDTH = 0.015    # shorter make/break phases are glitches
+DIGIT_TIMEOUT = 0.3        # gap after the last pulse that ends a digit
 
 # Audio devices
 HANDSET_DEVICE = "plughw:1,0"
 INTERNAL_DEVICE = "plughw:0,0"
+RECORD_RATE = 48000
+OUTPUT_RATE = 48000
+OUTPUT_CHUNK = 480  # frames per write to an output stream (10 ms)
+CAPTURE_FRAME_MS = 30  # handset mic frame size; webrtcvad takes 10, 20 or 30 ms
+CAPTURE_RING_SECONDS = 40  # mic history kept during a call (longest turn plus pre-roll)
+CAPTURE_PREROLL = 0.3  # seconds from before the end of the prompt included in each recording
+STT_RATE = 16000  # recordings go to the recognizer at 16 kHz (the VAD's rate) or at RECORD_RATE
+ENDPOINT_ADAPTIVE = True  # learn each caller's pause lengths instead of a fixed end-of-turn silence
+ENDPOINT_MIN_SILENCE = 0.5  # shortest trailing silence that ends a turn (seconds)
+ENDPOINT_MAX_SILENCE = 1.5  # longest, and the fixed timeout when ENDPOINT_ADAPTIVE is off
+ENDPOINT_MARGIN = 0.25  # added on top of the caller's usual longest mid-turn pause
+BARGE_IN = True  # the caller can talk over an LLM reply to cut it short
+BARGE_IN_MS = 90  # sustained caller speech that stops the reply
+BARGE_IN_ECHO_MARGIN = 2.0  # mic level must be this many times the expected echo of the earpiece
+BARGE_IN_ECHO_WINDOW = 0.15  # seconds of recent output the echo is compared against (output latency)
+BARGE_IN_COUPLING = 0.3  # starting guess at the earpiece-to-mic level ratio, learned per call
+BARGE_IN_LEARN = 0.3  # seconds of playback used to learn the echo before barge-in is allowed
 
 # LLM API settings
 LLM_API_URL = "http://192.168.0.49:11434/api/generate"
 LLM_MODEL = "gemma3"
+LLM_CHAT_URL = "http://192.168.0.49:11434/api/chat"
+LLM_CHAT_MODE = True  # use /api/chat with a bounded history instead of one growing prompt
+LLM_STREAMING = True  # speak each sentence as soon as it has been generated
+LLM_CONTEXT_TOKENS = 1500  # history budget per turn (system prompt + summary + messages)
+LLM_TRIM_TARGET = 0.6  # when over budget, trim down to this fraction of it
+LLM_KEEP_MESSAGES = 4  # most recent messages are always sent verbatim
+LLM_SPECULATE = True  # start transcribing and the reply when the caller pauses, before the turn ends
+LLM_SPECULATE_SILENCE = 0.3  # seconds of trailing silence that count as a pause
+LLM_KEEP_ALIVE = "30m"  # how long Ollama keeps the model loaded after each request
+LLM_WARM_INTERVAL = 900  # seconds between keep-alive pings during CALL_HOURS
+LLM_COLD_START = 1.0  # a warm-up slower than this (seconds) had to load the model
+CALL_HOURS = (9, 19)  # daytime window for random incoming calls and keep-alive pings
+
+# Outbound HTTP (LLM and phone services share one connection pool)
+HTTP_CONNECT_TIMEOUT = 3.0
+HTTP_READ_TIMEOUT = 30.0
+HTTP_MAX_PER_HOST = 2  # idle connections kept per host; busier moments open extra ones
+HTTP_RETRIES = 2
+HTTP_BACKOFF = 0.25  # seconds, doubled per retry and jittered
+HTTP_RETRY_STATUS = (429, 502, 503, 504)
 
 # Voice engine
 VOICE_ENGINE = "espeak"
 
+# Speech-to-text: "google" (online) or "vosk" (local, CPU only)
+STT_ENGINE = "google"
+VOSK_MODEL_PATH = "/home/pi/rotary-phone/vosk-model-small-en-us-0.15"
+STT_FIXTURE_DIR = "/home/pi/rotary-phone/stt_fixtures"  # <name>.wav + <name>.txt pairs for --bench-stt
+STT_STREAM_LEADIN = 0.3  # seconds before speech onset also sent to a streaming recognizer
+
 # Music folders mapping
 MUSIC_BASE = "/mnt/usb/Music"
 MUSIC_FOLDERS = {
@@ -44,6 +100,11 @@ MUSIC_FOLDERS = {
     "182": ["Blink-182 Neighborhoods (Deluxe) (Full Album)", "blink182"],
     "786": None
 }
+MUSIC_EXTENSIONS = ('.mp3', '.mp4', '.wav', '.ogg', '.m4a')
+MUSIC_INDEX_FILE = "/home/pi/rotary-phone/music_index.json"
+MUSIC_REFRESH_INTERVAL = 600  # seconds between background rescans of the USB drive
+MUSIC_SHUFFLE_POOL = 1000  # tracks held for random picks while the rest are still being discovered
+MUSIC_BUFFER_SECONDS = 2.0  # decoded audio buffered ahead per track; the next track starts decoding when this is all that's left
 
 MUSIC_DIRECTORY = """Music directory:
     Dial 7 8 6 to shuffle all music.
@@ -57,6 +118,65 @@ MUSIC_DIRECTORY = """Music directory:
     Dial 7 8 6 7 for Tom Petty.
     Dial 6 1 1 to hear this menu again."""
 
+DIRECTORY = """Directory of services:
+    Dial 4 1 1 for AI assistant.
+    Dial 6 1 1 for music directory.
+    Dial 7 4 2 for Simpsons soundboard.
+    Dial 7 8 6 for shuffle all music.
+    Dial 8 4 6 to set a timer.
+    Dial 8 6 5 to set internal speaker volume.
+    Dial 5 5 5 1 2 1 2 for weather.
+    Dial 5 5 5 3 6 5 3 for a dad joke.
+    Dial 5 5 5 3 2 2 8 for a random fact.
+    Dial 5 5 5 3 2 8 3 for this day in history.
+    Dial 0 to hear this directory again."""
+
+FAREWELLS = ["Thank you for calling. Goodbye!", "Thanks for calling!", "Goodbye, and have a great day!", "Thank you, goodbye!"]
+
+# Fixed prompts rendered into the TTS cache in the background at startup
+STATIC_PROMPTS = [DIRECTORY, MUSIC_DIRECTORY] + FAREWELLS + [
+    "Speak naturally. I will respond when you pause.",
+    "Hello! I'm your AI assistant. How can I help?",
+    "Goodbye! Call again anytime.",
+    "Sorry, I didn't catch that. Could you repeat?",
+    "Checking the current weather for Knox, Indiana.",
+    "Here's a dad joke for you.",
+    "Here's a random fact for you.",
+    "Here's what happened on this day in history.",
+    "Set a timer. Dial the number of minutes, then wait.",
+    "Please enter a number between 1 and 99.",
+    "Invalid number. Timer not set.",
+    "No number entered. Timer not set.",
+    "Your timer is complete!",
+    "No valid selection. Volume unchanged.",
+    "Sorry, no music files found.",
+    "Sorry, no Simpsons clips found.",
+] + [f"Internal speaker volume. Currently set to {v}x. Dial 1 for normal, 2 for double, 3 for triple."
+     for v in (1.0, 2.0, 3.0)]
+
+# Fixed parts of templated prompts, assembled with number words by PromptEngine
+PROMPT_PHRASES = [
+    "The number you dialed,", "is not in service. Dial 0 for a directory.",
+    "Timer set for", "minute.", "minutes.",
+    "Volume set to", "x.",
+    "Playing", "songs on shuffle.",
+]
+
+# TTS settings and cache of rendered prompts
+TTS_VOICE = "en-us"
+TTS_RATE = 150
+TTS_CACHE_DIR = "/home/pi/rotary-phone/tts_cache"
+TTS_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Decoded ring and off-hook audio kept in memory, gain already applied
+ASSET_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Simpsons soundboard (742)
+SOUNDBOARD_FOLDERS = ["/mnt/usb/Simpsons", "/mnt/usb/simpsons"]
+SOUNDBOARD_EXTENSIONS = ('.mp3', '.wav', '.ogg', '.m4a')
+SOUNDBOARD_CACHE_BYTES = 24 * 1024 * 1024  # decoded clips kept in RAM
+SOUNDBOARD_PRELOAD = 8  # clips decoded at startup, from the front of the shuffle-bag
+
 # Volume settings file
 VOLUME_FILE = "/home/pi/rotary-phone/volume_setting.txt"
 TIMER_FILE = "/home/pi/rotary-phone/timer.txt"
@@ -89,30 +209,242 @@ def set_internal_volume(multiplier):
     try:
         with open(VOLUME_FILE, 'w') as f:
             f.write(str(multiplier))
+        asset_cache.invalidate("internal")
         return True
     except:
         return False
 
-def get_music_files(folder_key):
-    audio_extensions = ('.mp3', '.mp4', '.wav', '.ogg', '.m4a')
-    files = []
-    if folder_key not in MUSIC_FOLDERS:
-        return files
-    folders = MUSIC_FOLDERS[folder_key]
-    if folders is None:
-        for root, dirs, filenames in os.walk(MUSIC_BASE):
-            for f in filenames:
-                if f.lower().endswith(audio_extensions):
-                    files.append(os.path.join(root, f))
-    else:
-        for folder in folders:
-            folder_path = os.path.join(MUSIC_BASE, folder)
-            if os.path.exists(folder_path):
-                for root, dirs, filenames in os.walk(folder_path):
-                    for f in filenames:
-                        if f.lower().endswith(audio_extensions):
-                            files.append(os.path.join(root, f))
-    return files
+class MusicLibrary:
+    """
+    On-disk index of the music on the USB drive, with per-dial-code track lists.
+    Each directory's entry stores its mtime, subdirectories and tracks (size,
+    mtime, duration, codec). A refresh re-lists only directories whose mtime
+    has changed, so it normally costs one stat per directory. Refreshes run
+    on a background thread, and a lookup is a dict read.
+    """
+    def __init__(self, base, index_file):
+        self.base = base
+        self.index_file = index_file
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.dirs = {}  # path -> {"mtime", "subdirs", "tracks": {name: info}}
+        self.tracks = {}  # dial code -> list of paths
+        self.ready = threading.Event()
+        self.load()
+    
+    def load(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                self.dirs = json.load(f).get("dirs", {})
+        except (OSError, ValueError):
+            self.dirs = {}
+            return
+        self.tracks = self._build_tracks(self.dirs)
+        self.ready.set()
+    
+    def save(self):
+        temp_file = self.index_file + ".tmp"
+        try:
+            with open(temp_file, 'w') as f:
+                json.dump({"dirs": self.dirs}, f)
+            os.replace(temp_file, self.index_file)
+        except OSError as e:
+            print(f"Could not save music index: {e}")
+    
+    def refresh(self):
+        with self.refresh_lock:
+            self._refresh()
+    
+    def _refresh(self):
+        if not os.path.isdir(self.base):
+            # Drive not mounted (yet): keep whatever index we have and don't save
+            print(f"Music index: {self.base} not found, skipping refresh")
+            return
+        start = time.monotonic()
+        old_dirs = self.dirs
+        dirs = {}
+        rescanned = 0
+        pending = [self.base]
+        while pending:
+            path = pending.pop()
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            entry = old_dirs.get(path)
+            if entry is None or entry["mtime"] != mtime:
+                entry = self._scan_dir(path, mtime, entry)
+                rescanned += 1
+            if entry is None:
+                continue
+            dirs[path] = entry
+            pending.extend(os.path.join(path, name) for name in entry["subdirs"])
+        tracks = self._build_tracks(dirs)
+        with self.lock:
+            self.dirs = dirs
+            self.tracks = tracks
+        self.ready.set()
+        if rescanned or len(dirs) != len(old_dirs):
+            self.save()
+        print(f"Music index: {len(tracks.get('786', []))} tracks, {rescanned}/{len(dirs)} "
+              f"directories rescanned in {time.monotonic() - start:.2f}s")
+    
+    def _scan_dir(self, path, mtime, old_entry):
+        old_tracks = old_entry["tracks"] if old_entry else {}
+        subdirs = []
+        tracks = {}
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            return None
+        for entry in entries:
+            if entry.is_dir():
+                subdirs.append(entry.name)
+            elif entry.name.lower().endswith(MUSIC_EXTENSIONS):
+                stat = entry.stat()
+                info = old_tracks.get(entry.name)
+                if not info or info["size"] != stat.st_size or info["mtime"] != stat.st_mtime:
+                    info = {"size": stat.st_size, "mtime": stat.st_mtime,
+                            "duration": self._duration(entry.path),
+                            "codec": os.path.splitext(entry.name)[1][1:].lower()}
+                tracks[entry.name] = info
+        return {"mtime": mtime, "subdirs": sorted(subdirs), "tracks": tracks}
+    
+    def _duration(self, filename):
+        try:
+            if filename.lower().endswith('.wav'):
+                with wave.open(filename, 'rb') as wf:
+                    return wf.getnframes() / wf.getframerate()
+            result = subprocess.run(["soxi", "-D", filename], stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, timeout=10)
+            return float(result.stdout)
+        except:
+            return None
+    
+    def _build_tracks(self, dirs):
+        all_tracks = sorted(os.path.join(path, name) for path, entry in dirs.items() for name in entry["tracks"])
+        tracks = {}
+        for code, folders in MUSIC_FOLDERS.items():
+            if folders is None:
+                tracks[code] = all_tracks
+            else:
+                prefixes = tuple(os.path.join(self.base, folder) + os.sep for folder in folders)
+                tracks[code] = [path for path in all_tracks if path.startswith(prefixes)]
+        return tracks
+    
+    def shuffle(self, code):
+        """
+        ShuffleQueue over a dial code's tracks that can start at once. With an
+        index the tracks come from a lazy permutation of the indexed list, and
+        without one (or if the index has nothing for the code, e.g. the drive
+        was mounted since the last refresh) the folders are walked in random
+        order as playback goes.
+        """
+        if self.ready.is_set():
+            with self.lock:
+                tracks = self.tracks.get(code, [])
+            if tracks:
+                return ShuffleQueue(lazy_permutation(tracks), len(tracks))
+        return ShuffleQueue(self._walk(MUSIC_FOLDERS.get(code)))
+    
+    def _walk(self, folders):
+        if folders is None:
+            pending = [self.base]
+        else:
+            pending = [os.path.join(self.base, folder) for folder in folders]
+        while pending:
+            path = pending.pop(random.randrange(len(pending)))
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+            # Directory order is usually track order, and early picks come
+            # from a nearly empty pool
+            random.shuffle(entries)
+            for entry in entries:
+                if entry.is_dir():
+                    pending.append(entry.path)
+                elif entry.name.lower().endswith(MUSIC_EXTENSIONS):
+                    yield entry.path
+    
+    def start(self, interval=MUSIC_REFRESH_INTERVAL):
+        def run():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Music index refresh failed: {e}")
+                time.sleep(interval)
+        threading.Thread(target=run, daemon=True).start()
+
+def lazy_permutation(items):
+    """Fisher-Yates shuffle done one pick at a time; only swapped slots are stored"""
+    swaps = {}
+    count = len(items)
+    for i in range(count):
+        j = random.randrange(i, count)
+        yield items[swaps.get(j, j)]
+        swaps[j] = swaps.get(i, i)
+        swaps.pop(i, None)
+
+class ShuffleQueue:
+    """
+    Random track order without repeats over a source that is still being read.
+    A background thread keeps a pool of at most pool_size tracks topped up
+    from the source, and next() takes a random one out of the pool.
+    """
+    def __init__(self, source, total=None, pool_size=MUSIC_SHUFFLE_POOL):
+        self.total = total
+        self.pool_size = pool_size
+        self.pool = []
+        self.discovered = 0
+        self.played = 0
+        self.exhausted = False
+        self.closed = False
+        self.cond = threading.Condition()
+        threading.Thread(target=self._fill, args=(source,), daemon=True).start()
+    
+    def _fill(self, source):
+        try:
+            for path in source:
+                with self.cond:
+                    while len(self.pool) >= self.pool_size and not self.closed:
+                        self.cond.wait()
+                    if self.closed:
+                        return
+                    self.pool.append(path)
+                    self.discovered += 1
+                    self.cond.notify_all()
+        finally:
+            with self.cond:
+                self.exhausted = True
+                self.cond.notify_all()
+    
+    def next(self, timeout=None):
+        """
+        Next random track, or None once every track has been played (or if
+        none has been found within timeout; see done()).
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.pool or self.exhausted, timeout)
+            if not self.pool:
+                return None
+            i = random.randrange(len(self.pool))
+            self.pool[i], self.pool[-1] = self.pool[-1], self.pool[i]
+            self.played += 1
+            self.cond.notify_all()
+            return self.pool.pop()
+    
+    def done(self):
+        with self.cond:
+            return self.exhausted and not self.pool
+    
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+music_library = MusicLibrary(MUSIC_BASE, MUSIC_INDEX_FILE)
 
 def find_ring_audio():
     ring_path = "/mnt/usb/ring.mp3"
@@ -167,10 +499,11 @@ def set_last_random_call():
     except:
         pass
 
+def in_call_hours():
+    return CALL_HOURS[0] <= datetime.now().hour < CALL_HOURS[1]
+
 def should_random_call():
-    now = datetime.now()
-    hour = now.hour
-    if hour < 9 or hour >= 19:
+    if not in_call_hours():
         return False
     last_call = get_last_random_call()
     hours_since_last = (time.time() - last_call) / 3600
@@ -180,57 +513,828 @@ def should_random_call():
         return True
     return False
 
-class RotaryPhone:
+class Playback:
+    """
+    Handle for one item in an AudioOutputEngine queue.
+    Popen-like (poll/wait/terminate) so it drops into the existing call flows.
+    """
+    def __init__(self, source, gain=1.0):
+        self.source = source  # iterator of PCM chunks at OUTPUT_RATE
+        self.gain = gain
+        self.cancelled = False
+        self.frames_played = 0
+        self.done = threading.Event()
+    
+    def poll(self):
+        return 0 if self.done.is_set() else None
+    
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        return self.poll()
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    terminate = cancel
+    kill = cancel
+
+class AudioOutputEngine:
+    """
+    Long-lived playback engine for one output device. A writer thread feeds
+    queued Playbacks to the device's open stream in OUTPUT_CHUNK pieces,
+    applying gain in-process, so cancelling takes effect on the next 10 ms
+    chunk. Counts underruns during playback and tracks queue depth, and keeps
+    the level of the last few chunks written as an echo reference.
+    """
+    def __init__(self, hw, device):
+        self.hw = hw
+        self.device = device
+        self.queue = []
+        self.cond = threading.Condition()
+        self.running = True
+        self.underruns = 0
+        self.played = 0
+        self.max_depth = 0
+        self.levels = deque(maxlen=64)  # (time written, RMS) per chunk
+        hw.set_full_volume(device)
+        self.stream = hw.output(device)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def play(self, source, gain=1.0):
+        playback = Playback(source, gain)
+        with self.cond:
+            self.queue.append(playback)
+            self.max_depth = max(self.max_depth, len(self.queue))
+            self.cond.notify()
+        return playback
+    
+    def cancel_all(self):
+        with self.cond:
+            for playback in self.queue:
+                playback.cancel()
+    
+    def queue_depth(self):
+        with self.cond:
+            return len(self.queue)
+    
+    def _run(self):
+        while self.running:
+            with self.cond:
+                while self.running and not self.queue:
+                    self.cond.wait()
+                if not self.running:
+                    break
+                playback = self.queue[0]
+            self._play(playback)
+            with self.cond:
+                self.queue.pop(0)
+            self.played += 1
+            playback.done.set()
+    
+    def _play(self, playback):
+        first = True
+        source = iter(playback.source)
+        try:
+            # Check for cancel before pulling the next chunk so a cancelled
+            # source can be resumed elsewhere without losing audio
+            while not playback.cancelled and self.running:
+                chunk = next(source, None)
+                if chunk is None:
+                    break
+                if playback.gain != 1.0:
+                    samples = np.frombuffer(chunk, dtype=np.int16) * playback.gain
+                    chunk = np.clip(samples, -32768, 32767).astype(np.int16).tobytes()
+                try:
+                    self.stream.write(chunk, exception_on_underflow=True)
+                except IOError:
+                    # The data was still written; an underflow before the first
+                    # chunk just means the device was idle
+                    if not first:
+                        self.underruns += 1
+                first = False
+                playback.frames_played += len(chunk) // 2
+                self.levels.append((time.monotonic(), VadFrontEnd.rms(chunk)))
+        except Exception as e:
+            print(f"Playback error on {self.device}: {e}")
+        finally:
+            close = getattr(playback.source, "close", None)
+            if close:
+                close()
+    
+    def output_level(self, window, at=None):
+        """Loudest chunk RMS written in the window seconds up to at (default now), 0 when silent"""
+        at = time.monotonic() if at is None else at
+        return max((level for written, level in list(self.levels) if 0 <= at - written <= window), default=0.0)
+    
+    def stats(self):
+        return {"underruns": self.underruns, "queued": self.queue_depth(),
+                "max_queued": self.max_depth, "played": self.played}
+    
+    def stop(self):
+        self.cancel_all()
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join(timeout=1)
+
+def pcm_chunks(pcm, loop=False):
+    """Iterate OUTPUT_CHUNK pieces of in-memory PCM, forever if loop"""
+    chunk_bytes = OUTPUT_CHUNK * 2
+    while True:
+        for pos in range(0, len(pcm), chunk_bytes):
+            yield pcm[pos:pos + chunk_bytes]
+        if not loop or not pcm:
+            return
+
+def decoder_chunks(filename, loop=False):
+    """
+    Stream a file as OUTPUT_RATE mono PCM chunks. MP3s are decoded by mpg123,
+    16-bit mono WAVs at the output rate are read directly, other WAVs are
+    converted in memory and anything else goes through sox.
+    The decoder process is killed when the iterator is closed.
+    """
+    chunk_bytes = OUTPUT_CHUNK * 2
+    if filename.lower().endswith('.wav'):
+        try:
+            with wave.open(filename, 'rb') as wf:
+                native = (wf.getframerate() == OUTPUT_RATE and wf.getnchannels() == 1
+                          and wf.getsampwidth() == 2)
+        except wave.Error:
+            native = False  # e.g. float WAVs, which decode_to_pcm hands to sox
+        if not native:
+            pcm, rate = decode_to_pcm(filename, OUTPUT_RATE)
+            samples = resample_linear(np.frombuffer(pcm, dtype=np.int16), rate, OUTPUT_RATE)
+            yield from pcm_chunks(samples.tobytes(), loop)
+            return
+        while True:
+            with wave.open(filename, 'rb') as wf:
+                while True:
+                    chunk = wf.readframes(OUTPUT_CHUNK)
+                    if not chunk:
+                        break
+                    yield chunk
+            if not loop:
+                return
+    if filename.lower().endswith(('.mp3', '.mp4')):
+        cmd = ["mpg123", "-q", "-s", "-m", "-r", str(OUTPUT_RATE)] + (["--loop", "-1"] if loop else []) + [filename]
+    else:
+        cmd = ["sox", filename, "-t", "raw", "-r", str(OUTPUT_RATE), "-c", "1", "-b", "16", "-e", "signed", "-"]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            chunk = process.stdout.read(chunk_bytes)
+            if len(chunk) < 2:
+                break
+            yield chunk[:len(chunk) - len(chunk) % 2]
+    finally:
+        process.kill()
+        process.wait()
+
+class MusicTrack:
+    """
+    A song decoded on its own thread into a bounded buffer, whose output can
+    be moved between devices. move() cancels the current playback and queues
+    the rest of the buffer on the other device, so it carries on from the
+    current sample position. decoded is set once the decoder has finished,
+    which is when the next track should be started.
+    """
+    def __init__(self, hw, filename, buffer_seconds=MUSIC_BUFFER_SECONDS):
+        self.hw = hw
+        self.filename = filename
+        self.buffer = queue.Queue(maxsize=max(1, int(buffer_seconds * OUTPUT_RATE / OUTPUT_CHUNK)))
+        self.decoded = threading.Event()
+        self.closed = False
+        self.playback = None
+        threading.Thread(target=self._decode, daemon=True).start()
+    
+    def _put(self, item):
+        while not self.closed:
+            try:
+                self.buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def _decode(self):
+        decoder = decoder_chunks(self.filename)
+        try:
+            for chunk in decoder:
+                if not self._put(chunk):
+                    break
+        except Exception as e:
+            print(f"Decode error for {self.filename}: {e}")
+        finally:
+            decoder.close()
+            self.decoded.set()
+            self._put(None)
+    
+    def _chunks(self):
+        while True:
+            chunk = self.buffer.get()
+            if chunk is None:
+                return
+            yield chunk
+    
+    def play(self, device, gain=1.0):
+        self.playback = self.hw.engine(device).play(self._chunks(), gain)
+        return self.playback
+    
+    def move(self, device, gain=1.0):
+        if self.playback is not None:
+            self.playback.cancel()
+            self.playback.wait(timeout=1)
+        return self.play(device, gain)
+    
+    def poll(self):
+        return self.playback.poll() if self.playback is not None else 0
+    
+    def close(self):
+        self.closed = True
+        if self.playback is not None:
+            self.playback.cancel()
+            self.playback.wait(timeout=1)
+        # Free the buffered audio now rather than when the track is collected
+        while not self.buffer.empty():
+            self.buffer.get_nowait()
+
+class HardwareBase:
+    """Playback shared by both backends: one AudioOutputEngine per output device."""
+    tts_cache_dir = TTS_CACHE_DIR
+    
     def __init__(self):
+        self.engines = {}
+        self.engine_lock = threading.Lock()
+    
+    def engine(self, device):
+        with self.engine_lock:
+            engine = self.engines.get(device)
+            if engine is None:
+                engine = AudioOutputEngine(self, device)
+                self.engines[device] = engine
+            return engine
+    
+    def play(self, filename, device, loop=False, gain=1.0):
+        """Queue a file on a device; returns a Popen-like Playback"""
+        return self.engine(device).play(decoder_chunks(filename, loop), gain)
+    
+    def play_pcm(self, pcm, rate, device, loop=False, gain=1.0):
+        """Queue mono 16-bit PCM from memory on a device"""
+        if rate != OUTPUT_RATE:
+            pcm = resample_linear(np.frombuffer(pcm, dtype=np.int16), rate, OUTPUT_RATE).tobytes()
+        return self.engine(device).play(pcm_chunks(pcm, loop), gain)
+    
+    def audio_stats(self):
+        return {device: engine.stats() for device, engine in self.engines.items()}
+    
+    def print_audio_stats(self):
+        for device, stats in self.audio_stats().items():
+            print(f"Audio {device}: {stats['played']} clips, {stats['underruns']} underruns, "
+                  f"max queue {stats['max_queued']}")
+    
+    def stop_engines(self):
+        for engine in self.engines.values():
+            engine.stop()
+
+class PiHardware(HardwareBase):
+    """Real phone: RPi.GPIO for the dial and hook switch, ALSA/PyAudio for audio."""
+    def __init__(self):
+        super().__init__()
+        # Let PortAudio open the plughw devices so ALSA converts rate/channels
+        os.environ.setdefault("PA_ALSA_PLUGHW", "1")
+        import RPi.GPIO as GPIO
+        import pyaudio
+        self.GPIO = GPIO
+        self.pyaudio = pyaudio
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(ROTARY_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        GPIO.setup(HOOK_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        self.devices = {"handset": HANDSET_DEVICE, "internal": INTERNAL_DEVICE}
+        self.cards = {"handset": "1", "internal": "0"}
+        self.audio = pyaudio.PyAudio()
+        self.input_device_index = self._find_input_device()
+        self.outputs = {}
+        self.output_lock = threading.Lock()
+    
+    def _find_input_device(self):
+        """Find the input device index for the handset microphone"""
+        print("Searching for audio input devices...")
+        target_device = None
+        
+        for i in range(self.audio.get_device_count()):
+            info = self.audio.get_device_info_by_index(i)
+            name = info.get('name', '')
+            max_inputs = info.get('maxInputChannels', 0)
+            
+            print(f"  Device {i}: {name} (inputs: {max_inputs})")
+            
+            # Look for USB audio device or card 1 (adjust if needed)
+            if max_inputs > 0:
+                if 'usb' in name.lower() or 'card 1' in name.lower():
+                    target_device = i
+                    print(f"  -> Selected as input device")
+                elif target_device is None:
+                    # Fallback to first available input
+                    target_device = i
+        
+        if target_device is None:
+            print("Warning: No input device found, using default")
+            return None
+        
+        return target_device
+    
+    def input(self, pin):
+        return self.GPIO.input(pin)
+    
+    def add_edge_callback(self, pin, callback):
+        self.GPIO.add_event_detect(pin, self.GPIO.BOTH, callback=callback)
+    
+    def remove_edge_callback(self, pin):
+        self.GPIO.remove_event_detect(pin)
+    
+    def open_input(self, rate, frames_per_buffer):
+        return self.audio.open(format=self.pyaudio.paInt16, channels=1, rate=rate, input=True,
+                               input_device_index=self.input_device_index,
+                               frames_per_buffer=frames_per_buffer)
+    
+    def _find_output_device(self, device):
+        """PyAudio index of the ALSA card behind HANDSET_DEVICE/INTERNAL_DEVICE"""
+        card = "hw:" + self.devices[device].split(":")[-1]
+        for i in range(self.audio.get_device_count()):
+            info = self.audio.get_device_info_by_index(i)
+            if info.get('maxOutputChannels', 0) > 0 and card in info.get('name', ''):
+                return i
+        print(f"Warning: no output device matching {card}, using default")
+        return None
+    
+    def output(self, device):
+        """Output stream for a device, opened on first use and then kept open"""
+        with self.output_lock:
+            stream = self.outputs.get(device)
+            if stream is None:
+                stream = self.audio.open(format=self.pyaudio.paInt16, channels=1, rate=OUTPUT_RATE, output=True,
+                                         output_device_index=self._find_output_device(device),
+                                         frames_per_buffer=OUTPUT_CHUNK)
+                self.outputs[device] = stream
+            return stream
+    
+    def release_output(self, device):
+        with self.output_lock:
+            stream = self.outputs.pop(device, None)
+        if stream is not None:
+            try:
+                stream.stop_stream()
+                stream.close()
+            except Exception:
+                pass
+    
+    def set_full_volume(self, device):
+        subprocess.run(["amixer", "-c", self.cards[device], "set", "PCM", "100%"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    def cleanup(self):
+        self.stop_engines()
+        for device in list(self.outputs):
+            self.release_output(device)
+        self.audio.terminate()
+        self.GPIO.cleanup()
+
+def decode_to_pcm(filename, rate=RECORD_RATE):
+    """
+    Decode an audio file to mono 16-bit PCM. Returns (pcm bytes, sample rate).
+    PCM WAVs are read directly at their own rate (downmixed, 8/24/32-bit
+    converted); MP3s go through mpg123 and anything else through sox.
+    """
+    name = filename.lower()
+    if name.endswith('.wav'):
+        try:
+            with wave.open(filename, 'rb') as wf:
+                data = wf.readframes(wf.getnframes())
+                return wav_to_mono16(data, wf.getsampwidth(), wf.getnchannels()).tobytes(), wf.getframerate()
+        except wave.Error:
+            pass
+    if name.endswith(('.mp3', '.mp4')):
+        cmd = ["mpg123", "-q", "-s", "-m", "-r", str(rate), filename]
+    else:
+        cmd = ["sox", filename, "-t", "raw", "-r", str(rate), "-c", "1", "-b", "16", "-e", "signed", "-"]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    return result.stdout, rate
+
+def wav_to_mono16(data, width, channels):
+    """Interleaved PCM frames of any WAV sample width -> mono int16 array"""
+    if width == 1:
+        samples = ((np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128) << 8)
+    elif width == 2:
+        samples = np.frombuffer(data, dtype='<i2')
+    elif width == 3:
+        b = np.frombuffer(data, dtype=np.uint8)[:len(data) // 3 * 3].reshape(-1, 3)
+        samples = (b[:, 2].astype(np.int8).astype(np.int16) << 8) | b[:, 1].astype(np.int16)
+    elif width == 4:
+        samples = (np.frombuffer(data, dtype='<i4') >> 16).astype(np.int16)
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+    if channels > 1:
+        samples = samples[:len(samples) // channels * channels].reshape(-1, channels)
+        samples = samples.mean(axis=1).astype(np.int16)
+    return samples.astype(np.int16)
+
+def resample_linear(samples, src_rate, dst_rate):
+    """Linear-interpolation resample of a 1-D sample array"""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    count = int(round(len(samples) * dst_rate / src_rate))
+    positions = np.arange(count) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(samples.dtype)
+
+class PhoneScript:
+    """
+    Scripted hook and dial timeline for SimulatedHardware.
+    Offsets are seconds from the start of replay. Every transition gets a
+    random amount of contact bounce and every pulse some timing jitter,
+    drawn from a seeded RNG so a script replays identically.
+    truth records what was really done, for scoring the decoder.
+    """
+    def __init__(self, seed=0, bounce=0.002, max_bounces=3, jitter=0.003):
+        self.random = random.Random(seed)
+        self.bounce = bounce
+        self.max_bounces = max_bounces
+        self.jitter = jitter
+        self.edges = []  # (offset, pin, level)
+        self.truth = []  # (kind, value, offset)
+    
+    def _transition(self, t, pin, level):
+        self.edges.append((t, pin, level))
+        bounces = self.random.randint(0, self.max_bounces) if self.bounce > 0 else 0
+        times = sorted(self.random.uniform(0, self.bounce) for _ in range(2 * bounces))
+        for i, bt in enumerate(times):
+            self.edges.append((t + bt, pin, level if i % 2 else 1 - level))
+    
+    def pickup(self, at):
+        self._transition(at, HOOK_PIN, 1)
+        self.truth.append(("hook", True, at))
+        return at
+    
+    def hangup(self, at):
+        self._transition(at, HOOK_PIN, 0)
+        self.truth.append(("hook", False, at))
+        return at
+    
+    def dial(self, number, at, pps=10, break_ratio=0.6, gap=0.7):
+        """Dial a number starting at `at`; returns the offset after the last digit"""
+        t = at
+        period = 1.0 / pps
+        for ch in number:
+            for i in range(10 if ch == "0" else int(ch)):
+                brk = max(0.005, period * break_ratio + self.random.gauss(0, self.jitter))
+                mk = max(0.005, period * (1 - break_ratio) + self.random.gauss(0, self.jitter))
+                self._transition(t, ROTARY_PIN, 0)
+                self._transition(t + brk, ROTARY_PIN, 1)
+                t += brk + mk
+            self.truth.append(("digit", ch, t - mk))
+            t += gap
+        return t
+    
+    def glitch(self, at, width=0.004):
+        """A short spurious break on the dial line that should not count"""
+        self.edges.append((at, ROTARY_PIN, 0))
+        self.edges.append((at + width, ROTARY_PIN, 1))
+        return at + width
+
+class SimulatedInputStream:
+    """Microphone backed by a WAV file, read back in real time. Silence after the end."""
+    def __init__(self, filename, rate):
+        self.rate = rate
+        self.data = b""
+        if filename:
+            pcm, file_rate = decode_to_pcm(filename, rate)
+            if file_rate != rate:
+                print(f"Warning: {filename} is {file_rate} Hz, expected {rate} Hz")
+            self.data = pcm
+        self.pos = 0
+        self.next_time = time.monotonic()
+    
+    def read(self, num_frames, exception_on_overflow=False):
+        self.next_time += num_frames / self.rate
+        delay = self.next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        chunk = self.data[self.pos:self.pos + num_frames * 2]
+        self.pos += num_frames * 2
+        return chunk + b"\x00" * (num_frames * 2 - len(chunk))
+    
+    def stop_stream(self):
+        pass
+    
+    def close(self):
+        pass
+
+class SimulatedOutputStream:
+    """
+    Output stream backed by a WAV file. write() blocks in real time like a sound
+    card and, like PyAudio, can report an underflow when the writer fell behind.
+    """
+    def __init__(self, path, rate, buffer_time=0.02):
+        self.rate = rate
+        self.buffer_time = buffer_time
+        self.wf = wave.open(path, 'wb')
+        self.wf.setnchannels(1)
+        self.wf.setsampwidth(2)
+        self.wf.setframerate(rate)
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def write(self, data, exception_on_underflow=False):
+        with self.lock:
+            now = time.monotonic()
+            underflow = self.next_time + self.buffer_time < now
+            if self.next_time < now:
+                self.next_time = now  # the device ran dry; restart the clock
+            self.wf.writeframes(data)
+            self.next_time += len(data) / 2 / self.rate
+            # Sleep until only buffer_time of audio is left queued, like a
+            # blocking write into a sound card buffer
+            delay = self.next_time - self.buffer_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if underflow and exception_on_underflow:
+            raise IOError("Output underflowed")
+    
+    def stop_stream(self):
+        pass
+    
+    def close(self):
+        with self.lock:
+            self.wf.close()
+
+class SimulatedHardware(HardwareBase):
+    """
+    Simulated phone for running the dial decoder and audio paths on any Linux box.
+    GPIO levels come from replaying a PhoneScript on a background thread, the
+    microphone reads from input_file and everything played on a device is
+    written in real time to SIM_OUTPUT_DIR as <device>-stream-NNNN.wav. The
+    TTS cache lives there too, so nothing is written under /home/pi.
+    """
+    def __init__(self, input_file=None, output_dir=SIM_OUTPUT_DIR):
+        super().__init__()
+        self.levels = {ROTARY_PIN: 1, HOOK_PIN: 0}
+        self.callbacks = {}
+        self.input_file = input_file
+        self.output_dir = output_dir
+        self.tts_cache_dir = os.path.join(output_dir, "tts_cache")
+        self.clip_count = 0
+        self.start_time = None
+        self.outputs = {}
+        os.makedirs(output_dir, exist_ok=True)
+    
+    def replay(self, script, lead=0.05):
+        """Start replaying a script; returns the monotonic time of offset zero"""
+        self.start_time = time.monotonic() + lead
+        edges = sorted(script.edges, key=lambda e: e[0])
+        threading.Thread(target=self._replay, args=(edges,), daemon=True).start()
+        return self.start_time
+    
+    def _replay(self, edges):
+        for offset, pin, level in edges:
+            delay = self.start_time + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if self.levels[pin] != level:
+                self.levels[pin] = level
+                callback = self.callbacks.get(pin)
+                if callback:
+                    callback(pin)
+    
+    def input(self, pin):
+        return self.levels[pin]
+    
+    def add_edge_callback(self, pin, callback):
+        self.callbacks[pin] = callback
+    
+    def remove_edge_callback(self, pin):
+        self.callbacks.pop(pin, None)
+    
+    def open_input(self, rate, frames_per_buffer):
+        return SimulatedInputStream(self.input_file, rate)
+    
+    def output(self, device):
+        stream = self.outputs.get(device)
+        if stream is None:
+            stream = SimulatedOutputStream(self.next_output_file(device + "-stream"), OUTPUT_RATE)
+            self.outputs[device] = stream
+        return stream
+    
+    def release_output(self, device):
+        stream = self.outputs.pop(device, None)
+        if stream is not None:
+            stream.close()
+    
+    def set_full_volume(self, device):
+        pass
+    
+    def next_output_file(self, device):
+        self.clip_count += 1
+        return os.path.join(self.output_dir, f"{device}-{self.clip_count:04d}.wav")
+    
+    def cleanup(self):
+        self.callbacks = {}
+        self.stop_engines()
+        for device in list(self.outputs):
+            self.release_output(device)
+
+def create_hardware():
+    if HARDWARE_BACKEND == "sim":
+        return SimulatedHardware()
+    return PiHardware()
+
+class PulseDecoder:
+    """
+    Edge-triggered decoder for the rotary dial and hook switch.
+    GPIO edge callbacks only stamp the edge with the monotonic clock and the
+    pin's level and queue it. A decoder thread replays the queued edges in
+    timestamp order, so a late-running thread still sees every pulse: a burst
+    of edges closes when the gap to the next one exceeds the pin's debounce
+    window, and its last level decides whether it was a real transition or a
+    glitch. Emits ("digit", digit, t) and ("hook", off_hook, t) events.
+    """
+    def __init__(self, hw, digit_timeout=DIGIT_TIMEOUT):
+        self.hw = hw
+        self.digit_timeout = digit_timeout
+        self.edges = queue.Queue()
+        self.events = queue.Queue()
+        self.levels = {ROTARY_PIN: hw.input(ROTARY_PIN), HOOK_PIN: hw.input(HOOK_PIN)}
+        self.debounce = {ROTARY_PIN: EDGE_DEBOUNCE, HOOK_PIN: HOOK_DEBOUNCE}
+        self.bursts = {}  # pin -> [first edge time, last edge time, level after last edge]
+        now = time.monotonic()
+        self.last_fall = now
+        self.last_rise = now
+        self.last_rotary_edge = now
+        self.pulse_counted = False
         self.pulse_count = 0
-        self.last_state = 1
-        self.last_change_time = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        hw.add_edge_callback(ROTARY_PIN, self._on_edge)
+        hw.add_edge_callback(HOOK_PIN, self._on_edge)
+    
+    def _on_edge(self, pin):
+        self.edges.put((pin, time.monotonic(), self.hw.input(pin)))
+    
+    def _next_deadline(self):
+        deadlines = [last + self.debounce[pin] for pin, (first, last, level) in self.bursts.items()]
+        if self.pulse_count > 0:
+            deadlines.append(self.last_rotary_edge + self.digit_timeout)
+        return min(deadlines) if deadlines else None
+    
+    def _run(self):
+        while self.running:
+            deadline = self._next_deadline()
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            batch = []
+            try:
+                item = self.edges.get(timeout=timeout)
+                while item is not None:
+                    batch.append(item)
+                    item = self.edges.get_nowait()
+            except queue.Empty:
+                pass
+            if not self.running:
+                break
+            for pin, t, level in sorted(batch, key=lambda edge: edge[1]):
+                self._edge(pin, t, level)
+            self._settle(time.monotonic())
+    
+    def _edge(self, pin, t, level):
+        burst = self.bursts.get(pin)
+        if burst is not None and t - burst[1] >= self.debounce[pin]:
+            # The pin was quiet for a debounce window before this edge
+            del self.bursts[pin]
+            self._close(pin, burst)
+            burst = None
+        if burst is None:
+            self.bursts[pin] = [t, t, level]
+        else:
+            burst[1] = t
+            burst[2] = level
+    
+    def _close(self, pin, burst):
+        first, last, level = burst
+        if level == self.levels[pin]:
+            return  # spike shorter than the debounce window
+        self.levels[pin] = level
+        if pin == HOOK_PIN:
+            self.events.put(("hook", level == 1, first))
+            return
+        if self.pulse_count > 0 and first - self.last_rotary_edge > self.digit_timeout:
+            self._emit_digit(self.last_rotary_edge + self.digit_timeout)
+        self._rotary_edge(level, first)
+    
+    def _settle(self, now):
+        for pin, burst in list(self.bursts.items()):
+            if now - burst[1] >= self.debounce[pin]:
+                del self.bursts[pin]
+                self._close(pin, burst)
+        if self.pulse_count > 0 and ROTARY_PIN not in self.bursts \
+                and now - self.last_rotary_edge > self.digit_timeout:
+            self._emit_digit(self.last_rotary_edge + self.digit_timeout)
+    
+    def _rotary_edge(self, level, t):
+        self.last_rotary_edge = t
+        if level == 0:
+            # A pulse starts on the falling edge, as long as the preceding
+            # high phase was long enough to be a real make/break
+            self.pulse_counted = (t - self.last_rise) >= PULSE_MIN_WIDTH
+            if self.pulse_counted:
+                self.pulse_count += 1
+            self.last_fall = t
+        else:
+            if self.pulse_counted and (t - self.last_fall) < PULSE_MIN_WIDTH:
+                self.pulse_count -= 1
+                print("Rejected dial glitch")
+            self.pulse_counted = False
+            self.last_rise = t
+    
+    def _emit_digit(self, t):
+        count = self.pulse_count
+        self.pulse_count = 0
+        if count > 10:
+            print(f"Rejected {count} pulses (not a digit)")
+            return
+        digit = str(count if count < 10 else 0)
+        print(f"Digit dialed: {digit}")
+        self.events.put(("digit", digit, t))
+    
+    def next_event(self, timeout=None):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def clear(self):
+        while self.next_event(0) is not None:
+            pass
+    
+    def stop(self):
+        self.running = False
+        self.edges.put(None)
+        try:
+            self.hw.remove_edge_callback(ROTARY_PIN)
+            self.hw.remove_edge_callback(HOOK_PIN)
+        except:
+            pass
+
+class RotaryPhone:
+    def __init__(self, hw):
+        self.hw = hw
         self.dialed_number = ""
-        self.digit_timeout = 0.3
         self.number_timeout = 2.0
+        self.hangup_time = 0.5
         self.offhook_process = None
+        self.decoder = PulseDecoder(hw)
     
     def is_off_hook(self):
-        return GPIO.input(HOOK_PIN) == 1
+        return self.hw.input(HOOK_PIN) == 1
     
     def is_on_hook(self):
-        return GPIO.input(HOOK_PIN) == 0
+        return self.hw.input(HOOK_PIN) == 0
     
-    def wait_for_pickup(self):
+    def next_event(self, timeout=None):
+        return self.decoder.next_event(timeout)
+    
+    def clear_events(self):
+        self.decoder.clear()
+    
+    def wait_for_pickup(self, on_lift=None):
+        """Block until the handset has been off hook for a second; on_lift() is called as soon as it moves"""
         print("Waiting for pickup...")
+        self.clear_events()
+        lifted_at = time.monotonic() if self.is_off_hook() else None
+        if lifted_at is not None and on_lift:
+            on_lift()
         while True:
-            if self.is_off_hook():
-                time.sleep(1.0)
-                if self.is_off_hook():
+            timeout = None if lifted_at is None else max(0, lifted_at + 1.0 - time.monotonic())
+            event = self.next_event(timeout)
+            if event is None:
+                if lifted_at is not None and self.is_off_hook():
                     print("Handset lifted!")
                     return True
-            time.sleep(0.1)
-    
-    def detect_pulse(self):
-        current_state = GPIO.input(ROTARY_PIN)
-        now = time.time()
-        if self.last_state == 1 and current_state == 0:
-            self.pulse_count += 1
-            self.last_change_time = now
-        self.last_state = current_state
-        if self.pulse_count > 0 and (now - self.last_change_time) > self.digit_timeout:
-            digit = str(self.pulse_count if self.pulse_count < 10 else 0)
-            self.dialed_number += digit
-            print(f"Digit dialed: {digit}")
-            self.pulse_count = 0
-            self.last_change_time = now
-            return True
-        return False
+                lifted_at = None
+                continue
+            kind, value, t = event
+            if kind == "hook":
+                lifted_at = t if value else None
+                if value and on_lift:
+                    on_lift()
     
     def play_offhook_tone(self, audio_file):
         try:
             if audio_file and os.path.exists(audio_file):
-                self.offhook_process = subprocess.Popen(
-                    ["mpg123", "-o", "alsa", "-q", "-a", HANDSET_DEVICE, "--loop", "-1", audio_file],
-                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                self.offhook_process = self.hw.play_pcm(asset_cache.get(audio_file, "handset"), OUTPUT_RATE,
+                                                        "handset", loop=True)
                 print(f"Playing off-hook audio: {audio_file}")
             else:
-                print("Off-hook audio file not found, skipping")
+                self.offhook_process = self.hw.play_pcm(tone_bank.cadence("dial"), OUTPUT_RATE, "handset", loop=True)
+                print("Off-hook audio file not found, playing dial tone")
         except Exception as e:
             print(f"Error playing off-hook audio: {e}")
     
@@ -248,174 +1352,931 @@ class RotaryPhone:
                 except:
                     pass
     
-    def get_dialed_number(self):
+    def get_dialed_number(self, max_wait=None, max_digits=None):
+        """
+        Block on decoder events until a number has been dialed.
+        Returns the number, "" if max_wait passes with nothing dialed,
+        or None once the handset has been stably on hook for hangup_time.
+        """
+        self.clear_events()
         self.dialed_number = ""
-        self.pulse_count = 0
-        hung_up_start = None
+        start = time.monotonic()
+        last_digit = start
+        hung_up_start = start if self.is_on_hook() else None
         print("Waiting for number...")
         while True:
-            if self.is_on_hook():
-                if hung_up_start is None:
-                    hung_up_start = time.time()
-                elif time.time() - hung_up_start > 0.5:
+            deadlines = []
+            if hung_up_start is not None:
+                deadlines.append(hung_up_start + self.hangup_time)
+            if self.dialed_number:
+                deadlines.append(last_digit + self.number_timeout)
+            elif max_wait is not None:
+                deadlines.append(start + max_wait)
+            timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            event = self.next_event(timeout)
+            now = time.monotonic()
+            if event is None:
+                if hung_up_start is not None and now - hung_up_start >= self.hangup_time:
+                    if self.is_on_hook():
+                        self.stop_offhook_tone()
+                        print("Detected stable hang up")
+                        return None
+                    hung_up_start = None
+                if self.dialed_number and now - last_digit >= self.number_timeout:
+                    break
+                if not self.dialed_number and max_wait is not None and now - start >= max_wait:
+                    return ""
+                continue
+            kind, value, t = event
+            if kind == "hook":
+                hung_up_start = None if value else t
+            elif kind == "digit":
+                self.dialed_number += value
+                last_digit = now
+                if self.offhook_process:
                     self.stop_offhook_tone()
-                    print("Detected stable hang up")
-                    return None
+                if max_digits and len(self.dialed_number) >= max_digits:
+                    break
+        number = self.dialed_number
+        self.dialed_number = ""
+        return number
+    
+    def cleanup(self):
+        self.decoder.stop()
+
+class ToneBank:
+    """
+    Tone buffers at the output rate, generated in one vectorized pass and
+    cached by (frequencies, duration, level). Cadences are one full on/off
+    cycle, ready to be looped.
+    """
+    CADENCES = {
+        # name: (frequencies, seconds on, seconds off)
+        "dial": ((350, 440), 1.0, 0.0),
+        "ringback": ((440, 480), 2.0, 4.0),
+    }
+    
+    def __init__(self, rate=OUTPUT_RATE):
+        self.rate = rate
+        self.cache = {}
+    
+    def tone(self, frequencies, duration, level=0.3, fade=0.01):
+        """Mono 16-bit PCM of a (multi-)sine with faded edges"""
+        if isinstance(frequencies, (int, float)):
+            frequencies = (frequencies,)
+        key = (tuple(frequencies), duration, level, fade)
+        pcm = self.cache.get(key)
+        if pcm is None:
+            n = int(self.rate * duration)
+            t = np.arange(n) / self.rate
+            signal = np.sin(2 * np.pi * np.outer(frequencies, t)).mean(axis=0)
+            fade_len = min(int(self.rate * fade), n // 2)
+            if fade_len:
+                ramp = np.arange(fade_len) / fade_len
+                signal[:fade_len] *= ramp
+                signal[n - fade_len:] *= ramp[::-1]
+            pcm = (signal * level * 32767).astype(np.int16).tobytes()
+            self.cache[key] = pcm
+        return pcm
+    
+    def cadence(self, name, level=0.3):
+        """One cycle of a call-progress tone. A steady tone has no fade so it loops seamlessly."""
+        frequencies, on, off = self.CADENCES[name]
+        pcm = self.tone(frequencies, on, level, fade=0.01 if off else 0.0)
+        return pcm + b"\x00\x00" * int(self.rate * off)
+
+tone_bank = ToneBank()
+
+class AssetCache:
+    """
+    Audio files decoded to OUTPUT_RATE PCM with the device gain already
+    applied, kept in memory in least-recently-used order up to max_bytes.
+    Entries are keyed by (path, mtime, volume, device), so an edited file or a
+    new volume renders again. Assets passed to prerender() are re-rendered in
+    the background whenever a device is invalidated.
+    """
+    def __init__(self, max_bytes=ASSET_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> PCM bytes, least recently used first
+        self.total_bytes = 0
+        self.prerendered = []
+        self.hits = 0
+        self.misses = 0
+    
+    def key(self, path, device):
+        volume = get_internal_volume() if device == "internal" else 1.0
+        return (path, os.path.getmtime(path), volume, device)
+    
+    def get(self, path, device):
+        """Rendered PCM for a file on a device, decoding it on a miss"""
+        key = self.key(path, device)
+        with self.lock:
+            pcm = self.entries.get(key)
+            if pcm is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return pcm
+            self.misses += 1
+        pcm = self.render(path, key[2])
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = pcm
+                self.total_bytes += len(pcm)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, old_pcm = self.entries.popitem(last=False)
+                self.total_bytes -= len(old_pcm)
+        return pcm
+    
+    def render(self, path, volume):
+        pcm, rate = decode_to_pcm(path, OUTPUT_RATE)
+        samples = resample_linear(np.frombuffer(pcm, dtype=np.int16), rate, OUTPUT_RATE)
+        if volume != 1.0:
+            samples = np.clip(samples * volume, -32768, 32767).astype(np.int16)
+        return samples.tobytes()
+    
+    def invalidate(self, device):
+        with self.lock:
+            for key in [key for key in self.entries if key[3] == device]:
+                self.total_bytes -= len(self.entries.pop(key))
+        self.prerender(self.prerendered)
+    
+    def prerender(self, assets):
+        """Render (path, device) pairs on a background thread"""
+        self.prerendered = [(path, device) for path, device in assets if path]
+        def run():
+            start = time.monotonic()
+            for path, device in self.prerendered:
+                try:
+                    self.get(path, device)
+                except Exception as e:
+                    print(f"Could not render {path}: {e}")
+            print(f"Audio assets rendered in {time.monotonic() - start:.2f}s")
+        threading.Thread(target=run, daemon=True).start()
+
+asset_cache = AssetCache()
+
+class ClipBank:
+    """
+    Soundboard clips. The folder is listed once and again only when its mtime
+    changes. Clips come out of a shuffle-bag, so none repeats until all have
+    played, and decoded clips stay in RAM in their own AssetCache. The next
+    clip in the bag is decoded in the background so it's ready when dialled.
+    """
+    def __init__(self, folders, max_bytes):
+        self.folders = folders
+        self.cache = AssetCache(max_bytes)
+        self.lock = threading.Lock()
+        self.folder = None
+        self.mtime = None
+        self.clips = []
+        self.bag = []  # remaining clips in this round, next one last
+        self.last = None
+    
+    def _index(self):
+        folder = next((folder for folder in self.folders if os.path.isdir(folder)), None)
+        if folder is None:
+            self.folder, self.clips, self.bag = None, [], []
+            return
+        mtime = os.stat(folder).st_mtime
+        if folder == self.folder and mtime == self.mtime:
+            return
+        self.folder, self.mtime = folder, mtime
+        self.clips = sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                            if f.lower().endswith(SOUNDBOARD_EXTENSIONS))
+        self.bag = []
+    
+    def _refill(self):
+        self.bag = self.clips[:]
+        random.shuffle(self.bag)
+        # Don't let a new round start with the clip that ended the last one
+        if len(self.bag) > 1 and self.bag[-1] == self.last:
+            self.bag[0], self.bag[-1] = self.bag[-1], self.bag[0]
+    
+    def next(self):
+        """Next clip from the shuffle-bag, or None if there are no clips"""
+        with self.lock:
+            self._index()
+            if not self.clips:
+                return None
+            if not self.bag:
+                self._refill()
+            clip = self.bag.pop()
+            self.last = clip
+            upcoming = self.bag[-1:]
+        self.cache.prerender([(path, "handset") for path in upcoming])
+        return clip
+    
+    def pcm(self, clip):
+        return self.cache.get(clip, "handset")
+    
+    def start(self):
+        """Index the folder and decode the first clips of the bag in the background"""
+        with self.lock:
+            self._index()
+            if not self.bag:
+                self._refill()
+            preload = self.bag[-SOUNDBOARD_PRELOAD:]
+        self.cache.prerender([(path, "handset") for path in reversed(preload)])
+
+soundboard = ClipBank(SOUNDBOARD_FOLDERS, SOUNDBOARD_CACHE_BYTES)
+
+class TTSCache:
+    """
+    Content-addressed cache of rendered TTS clips on disk.
+    Clips are named by a hash of the normalized text, voice and rate. An
+    in-memory index keeps them in least-recently-used order (seeded from file
+    mtimes at startup) and the oldest are deleted once the total size goes
+    over max_bytes. The directory is only created when the first clip is.
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index = OrderedDict()  # key -> size, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        entries = []
+        for entry in (os.scandir(directory) if os.path.isdir(directory) else []):
+            if entry.name.endswith(".tmp"):
+                os.remove(entry.path)
+            elif entry.name.endswith(".wav"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for mtime, key, size in sorted(entries):
+            self.index[key] = size
+            self.total_bytes += size
+    
+    def key(self, text, voice, rate):
+        return hashlib.sha1(f"{voice}|{rate}|{text}".encode()).hexdigest()
+    
+    def path(self, key):
+        return os.path.join(self.directory, key + ".wav")
+    
+    def temp_path(self, key):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{key}.{threading.get_ident()}.tmp")
+    
+    def get(self, key):
+        with self.lock:
+            if key not in self.index:
+                self.misses += 1
+                return None
+            self.index.move_to_end(key)
+            self.hits += 1
+        path = self.path(key)
+        try:
+            os.utime(path)  # keeps LRU order across restarts
+        except OSError:
+            with self.lock:
+                self.total_bytes -= self.index.pop(key, 0)
+            return None
+        return path
+    
+    def put(self, key, temp_file):
+        path = self.path(key)
+        os.replace(temp_file, path)
+        size = os.path.getsize(path)
+        with self.lock:
+            self.total_bytes += size - self.index.pop(key, 0)
+            self.index[key] = size
+            while self.total_bytes > self.max_bytes and len(self.index) > 1:
+                old_key, old_size = self.index.popitem(last=False)
+                self.total_bytes -= old_size
+                try:
+                    os.remove(self.path(old_key))
+                except OSError:
+                    pass
+        return path
+
+NUMBER_WORDS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+                "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen",
+                "eighteen", "nineteen"]
+TENS_WORDS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+
+def number_words(n):
+    """Spoken words for a non-negative integer, e.g. 125 -> one hundred twenty five"""
+    if n < 20:
+        return [NUMBER_WORDS[n]]
+    if n < 100:
+        return [TENS_WORDS[n // 10]] + (number_words(n % 10) if n % 10 else [])
+    if n < 1000:
+        return number_words(n // 100) + ["hundred"] + (number_words(n % 100) if n % 100 else [])
+    return number_words(n // 1000) + ["thousand"] + (number_words(n % 1000) if n % 1000 else [])
+
+def digit_words(number):
+    """Spoken words for a dialed number, one word per digit"""
+    return [NUMBER_WORDS[int(d)] for d in number]
+
+def trim_silence(samples, rate, threshold=300, pad=0.015):
+    """Strip leading/trailing silence, keeping `pad` seconds on each side"""
+    loud = np.flatnonzero(np.abs(samples.astype(np.int32)) > threshold)
+    if len(loud) == 0:
+        return samples[:0]
+    margin = int(pad * rate)
+    return samples[max(0, loud[0] - margin):loud[-1] + margin + 1]
+
+class PromptEngine:
+    """
+    Speaks templated prompts ("Timer set for {n} minutes") by stitching together
+    clips of the fixed phrases and number words instead of synthesizing every
+    variant. Each clip is rendered once through the TTS cache, trimmed of edge
+    silence and kept in memory; parts are joined with short crossfades into a
+    single PCM buffer. A float part inserts that many seconds of silence.
+    """
+    def __init__(self, voice, crossfade=0.008):
+        self.voice = voice
+        self.crossfade = crossfade
+        self.rate = None
+        self.clips = {}
+        self.lock = threading.Lock()
+    
+    def clip(self, text):
+        samples = self.clips.get(text)
+        if samples is None:
+            pcm, rate = decode_to_pcm(self.voice.text_to_speech(text))
+            samples = np.frombuffer(pcm, dtype=np.int16)
+            with self.lock:
+                if self.rate is None:
+                    self.rate = rate
+            samples = trim_silence(resample_linear(samples, rate, self.rate), self.rate)
+            samples = samples.astype(np.float32)
+            self.clips[text] = samples
+        return samples
+    
+    def assemble(self, parts):
+        """Join the clips for parts into one buffer. Returns (pcm bytes, sample rate)."""
+        clips = [self.clip(part) for part in parts if not isinstance(part, float)]
+        fade_len = int(self.crossfade * self.rate)
+        pieces = []
+        tail = np.zeros(0, dtype=np.float32)
+        for part in parts:
+            if isinstance(part, float):
+                segment = np.zeros(int(part * self.rate), dtype=np.float32)
             else:
-                hung_up_start = None
-            self.detect_pulse()
-            if self.dialed_number and self.offhook_process:
-                self.stop_offhook_tone()
-            if self.dialed_number and (time.time() - self.last_change_time) > self.number_timeout:
-                number = self.dialed_number
-                self.dialed_number = ""
-                return number
-            time.sleep(0.001)
+                segment = clips.pop(0)
+            n = min(fade_len, len(tail), len(segment))
+            if n:
+                ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+                pieces.append(tail[:-n])
+                pieces.append(tail[-n:] * (1.0 - ramp) + segment[:n] * ramp)
+                tail = segment[n:]
+            else:
+                pieces.append(tail)
+                tail = segment
+        pieces.append(tail)
+        out = np.clip(np.concatenate(pieces), -32768, 32767).astype(np.int16)
+        return out.tobytes(), self.rate
+    
+    def say(self, parts, phone=None):
+        """Speak a templated prompt. Returns False if the caller hung up."""
+        try:
+            pcm, rate = self.assemble(parts)
+        except Exception as e:
+            print(f"Prompt assembly failed ({e}), synthesizing instead")
+            return self.voice.say(" ".join(p for p in parts if not isinstance(p, float)), phone)
+        return self.voice.play_pcm(pcm, rate, check_hangup=True, phone=phone)
+    
+    def prewarm(self, phrases):
+        """Load the template vocabulary into memory on a background thread"""
+        def load():
+            for phrase in phrases:
+                try:
+                    self.clip(phrase)
+                except Exception as e:
+                    print(f"Prompt clip error ({phrase}): {e}")
+        threading.Thread(target=load, daemon=True).start()
 
-class VoiceHandler:
+class VadFrontEnd:
+    """
+    Turns 48 kHz capture frames into 16 kHz frames for webrtcvad. A windowed-sinc
+    low-pass (cutoff just under the new Nyquist) is evaluated only at every
+    factor-th sample, i.e. one polyphase branch sum per output, and the filter
+    history carries across frames. All per-sample work is done in NumPy.
+    """
+    def __init__(self, in_rate=RECORD_RATE, out_rate=16000, taps_per_phase=16):
+        self.factor = in_rate // out_rate
+        taps = self.factor * taps_per_phase
+        cutoff = 0.45 * out_rate / in_rate  # cycles per input sample
+        n = np.arange(taps) - (taps - 1) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+        self.kernel = (h / h.sum())[::-1].astype(np.float32)
+        self.history = np.zeros(taps - 1, dtype=np.float32)
+    
+    def reset(self):
+        self.history[:] = 0
+    
+    def resample(self, frame):
+        """48 kHz int16 frame (bytes, length a multiple of factor) -> 16 kHz int16 bytes"""
+        samples = np.frombuffer(frame, dtype=np.int16)
+        buf = np.concatenate((self.history, samples))
+        self.history = buf[len(samples):]
+        windows = np.lib.stride_tricks.sliding_window_view(buf, len(self.kernel))[::self.factor]
+        out = windows @ self.kernel
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16).tobytes()
+    
+    @staticmethod
+    def rms(frame):
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        return float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+
+class Endpointer:
+    """
+    Per-call end-of-turn detector. Pauses the caller makes mid-turn (silence
+    followed by more speech) are remembered, and a turn ends once the trailing
+    silence is longer than nearly all of them. Short answers and speech that
+    trails off get a shorter wait; stopping on a loud syllable gets a longer
+    one. Starts from a few typical pause lengths until the caller has made some.
+    """
+    PRIOR_PAUSES = [0.4, 0.6, 0.8]
+    
+    def __init__(self, min_silence=ENDPOINT_MIN_SILENCE, max_silence=ENDPOINT_MAX_SILENCE,
+                 margin=ENDPOINT_MARGIN):
+        self.min_silence = min_silence
+        self.max_silence = max_silence
+        self.margin = margin
+        self.pauses = []
+        self.saved = []
+    
+    def add_pause(self, seconds):
+        """A silence that ended because the caller kept talking"""
+        if seconds >= 0.15:
+            self.pauses.append(seconds)
+    
+    def threshold(self, speech_seconds, tail_ratio):
+        """
+        Seconds of silence that end this turn, given how much speech it has had
+        and the loudness of its last speech frames relative to the turn's average.
+        """
+        base = float(np.percentile(self.PRIOR_PAUSES + self.pauses, 90)) + self.margin
+        if speech_seconds < 1.0:
+            base *= 0.75  # "yes", "no", a single number
+        if tail_ratio < 0.5:
+            base *= 0.85  # voice faded out - sounds finished
+        elif tail_ratio > 1.2:
+            base *= 1.25  # cut off mid-word - probably thinking
+        return min(max(base, self.min_silence), self.max_silence)
+    
+    def end_turn(self, seconds):
+        saved = self.max_silence - seconds
+        self.saved.append(saved)
+        print(f"  End of turn after {seconds:.2f}s of silence ({saved * 1000:.0f}ms sooner than fixed)")
+    
+    def summary(self):
+        if self.saved:
+            print(f"Endpointing: {len(self.saved)} turns, median {np.median(self.saved) * 1000:.0f}ms saved, "
+                  f"{len(self.pauses)} mid-turn pauses (longest {max(self.pauses, default=0):.2f}s)")
+
+class CaptureStream:
+    """
+    Handset microphone held open for a whole call. A thread reads fixed-size
+    frames into a ring buffer and counts them. Readers keep a frame position
+    and get memoryviews straight into the ring, so the VAD sees each frame
+    without a copy, and a reader can start up to a ring's length in the past,
+    which gives recordings their pre-roll.
+    """
+    def __init__(self, hw, rate=RECORD_RATE, frame_size=RECORD_RATE * CAPTURE_FRAME_MS // 1000,
+                 seconds=CAPTURE_RING_SECONDS):
+        self.rate = rate
+        self.frame_size = frame_size
+        self.frame_bytes = frame_size * 2
+        self.ring_frames = max(2, int(seconds * rate / frame_size))
+        self.ring = memoryview(bytearray(self.ring_frames * self.frame_bytes))
+        self.written = 0  # frames captured since the stream opened
+        self.cond = threading.Condition()
+        self.running = True
+        self.stream = hw.open_input(rate, frame_size)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def _run(self):
+        while self.running:
+            try:
+                data = self.stream.read(self.frame_size, exception_on_overflow=False)
+            except Exception as e:
+                print(f"Capture read error: {e}")
+                time.sleep(0.01)
+                continue
+            slot = (self.written % self.ring_frames) * self.frame_bytes
+            self.ring[slot:slot + len(data)] = data[:self.frame_bytes]
+            with self.cond:
+                self.written += 1
+                self.cond.notify_all()
+    
+    def position(self, preroll=0.0):
+        """Frame position preroll seconds back from now, for read()"""
+        with self.cond:
+            back = int(round(preroll * self.rate / self.frame_size))
+            return max(0, self.written - back, self.written - self.ring_frames + 1)
+    
+    def read(self, pos, timeout=1.0):
+        """
+        View of frame pos, waiting for it to be captured. Valid until the ring
+        wraps around to it again. Returns None on timeout.
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.written > pos or not self.running, timeout):
+                return None
+            if self.written <= pos:
+                return None
+        slot = (pos % self.ring_frames) * self.frame_bytes
+        return self.ring[slot:slot + self.frame_bytes]
+    
+    def frames(self, start, end):
+        """Copy of frames start..end as bytes (only the newest ring's worth survives)"""
+        start = max(start, end - self.ring_frames + 1)
+        return b"".join(self.ring[(pos % self.ring_frames) * self.frame_bytes:
+                                  (pos % self.ring_frames + 1) * self.frame_bytes] for pos in range(start, end))
+    
+    def close(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout=1)
+        try:
+            self.stream.stop_stream()
+            self.stream.close()
+        except Exception:
+            pass
+
+class BargeIn:
+    """
+    Listens to the handset mic while a reply plays so the caller can talk over
+    it. A frame counts as the caller only if the VAD hears speech and it is
+    clearly louder than the echo of what the earpiece just played; the
+    earpiece-to-mic coupling is learned from frames the echo explains, and
+    barge-in is held off until BARGE_IN_LEARN of it has been heard. After
+    BARGE_IN_MS of caller speech, triggered is set and take_start() gives the
+    capture position the speech began at, for the next recording.
+    """
+    def __init__(self, capture):
+        self.capture = capture
+        self.vad = webrtcvad.Vad(3)  # strictest - line noise must not stop a reply
+        self.front = VadFrontEnd(RECORD_RATE, 16000)
+        self.coupling = BARGE_IN_COUPLING
+        self.learned = 0  # echo frames heard this call
+        self.triggered = threading.Event()
+        self.start = None
+        self.running = False
+        self.thread = None
+    
+    def watch(self, engine):
+        """Start listening; what engine plays is the echo reference"""
+        self.stop()
+        self.triggered.clear()
+        self.start = None
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(engine,), daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+            self.thread = None
+    
+    def take_start(self):
+        """Capture position where the interrupting speech began, once"""
+        start, self.start = self.start, None
+        return start
+    
+    def _run(self, engine):
+        capture = self.capture
+        pos = capture.position()
+        self.front.reset()
+        needed = max(1, int(BARGE_IN_MS / CAPTURE_FRAME_MS))
+        learn_frames = int(BARGE_IN_LEARN * 1000 / CAPTURE_FRAME_MS)
+        leadin = int(STT_STREAM_LEADIN * 1000 / CAPTURE_FRAME_MS)
+        run = 0
+        while self.running and capture.running:
+            frame = capture.read(pos, timeout=0.1)
+            if frame is None:
+                continue
+            pos += 1
+            level = VadFrontEnd.rms(frame)
+            echo = engine.output_level(BARGE_IN_ECHO_WINDOW)
+            try:
+                is_speech = self.vad.is_speech(self.front.resample(frame), 16000)
+            except Exception:
+                is_speech = level > 500
+            louder = level > max(self.coupling * echo * BARGE_IN_ECHO_MARGIN, 300)
+            if echo > 100 and (self.learned < learn_frames or not louder):
+                # Explained by the earpiece - track how loud the echo runs
+                self.coupling = 0.9 * self.coupling + 0.1 * (level / echo)
+                self.learned += 1
+                run = 0
+                continue
+            if is_speech and louder and self.learned >= learn_frames:
+                run += 1
+            else:
+                run = 0
+            if run >= needed:
+                self.start = max(0, pos - run - leadin)
+                print(f"  Caller barged in (echo coupling {self.coupling:.2f})")
+                self.triggered.set()
+                return
+
+class SttEngine:
+    """
+    Speech-to-text backend. transcribe() takes an sr.AudioData and returns the
+    text, raising sr.UnknownValueError when nothing was recognized and
+    sr.RequestError when the engine itself failed. Engines with streaming set
+    also provide stream(rate), a session that recognizes while recording.
+    """
+    name = "base"
+    streaming = False
+
+class GoogleStt(SttEngine):
+    """Google's free web recognizer via SpeechRecognition (needs the internet)"""
+    name = "google"
+    
     def __init__(self):
-        self.audio = pyaudio.PyAudio()
         self.recognizer = sr.Recognizer()
+    
+    def transcribe(self, audio):
+        return self.recognizer.recognize_google(audio)
+
+class VoskStt(SttEngine):
+    """Offline Kaldi recognizer; the model is loaded once and reused for every turn"""
+    name = "vosk"
+    rate = 16000
+    streaming = True
+    
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        import vosk
+        vosk.SetLogLevel(-1)
+        self.vosk = vosk
+        start = time.monotonic()
+        self.model = vosk.Model(model_path)
+        print(f"Loaded Vosk model {os.path.basename(model_path)} in {time.monotonic() - start:.1f}s")
+    
+    def transcribe(self, audio):
+        pcm = audio.get_raw_data(convert_rate=self.rate, convert_width=2)
+        recognizer = self.vosk.KaldiRecognizer(self.model, self.rate)
+        step = self.rate // 2 * 2  # half a second of 16-bit samples
+        for pos in range(0, len(pcm), step):
+            recognizer.AcceptWaveform(pcm[pos:pos + step])
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+    
+    def stream(self, rate):
+        return VoskStream(self, rate)
+
+class VoskStream:
+    """
+    Incremental recognition of one turn. feed() queues audio while the caller
+    is still talking and a worker thread decodes it, printing partial
+    hypotheses, so result() after end() only has the last few frames left.
+    current() gives the text so far without ending the turn.
+    """
+    def __init__(self, engine, rate):
+        self.recognizer = engine.vosk.KaldiRecognizer(engine.model, rate)
+        self.chunks = queue.Queue()
+        self.segments = []
+        self.partial = ""
+        self.cancelled = False
+        self.fed = 0
+        self.decoded = 0
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def _run(self):
+        while True:
+            pcm = self.chunks.get()
+            if pcm is None or self.cancelled:
+                return
+            if self.recognizer.AcceptWaveform(pcm):
+                self.segments.append(json.loads(self.recognizer.Result()).get("text", ""))
+                self.partial = ""
+            else:
+                partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+                if partial and partial != self.partial:
+                    self.partial = partial
+                    print(f"  ... {partial}")
+            with self.cond:
+                self.decoded += 1
+                self.cond.notify_all()
+    
+    def feed(self, pcm):
+        with self.cond:
+            self.fed += 1
+        self.chunks.put(bytes(pcm))
+    
+    def current(self, timeout=1.0):
+        """Text recognized so far, once everything fed until now has been decoded"""
+        with self.cond:
+            fed = self.fed
+            self.cond.wait_for(lambda: self.decoded >= fed or self.cancelled, timeout)
+        return " ".join(segment for segment in self.segments + [self.partial] if segment)
+    
+    def end(self):
+        """No more audio for this turn"""
+        self.chunks.put(None)
+    
+    def result(self, timeout=10):
+        self.end()
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            self.cancel()
+            raise sr.RequestError("streaming recognizer timed out")
+        self.segments.append(json.loads(self.recognizer.FinalResult()).get("text", ""))
+        text = " ".join(segment for segment in self.segments if segment)
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+    
+    def cancel(self):
+        self.cancelled = True
+        self.chunks.put(None)
+        with self.cond:
+            self.cond.notify_all()
+
+def create_stt_engine(name=None):
+    name = name or STT_ENGINE
+    if name == "vosk":
+        try:
+            return VoskStt()
+        except Exception as e:
+            print(f"Vosk unavailable ({e}), using Google speech recognition")
+    return GoogleStt()
+
+class VoiceHandler:
+    def __init__(self, hw):
+        self.hw = hw
+        self.tts_cache = TTSCache(hw.tts_cache_dir, TTS_CACHE_MAX_BYTES)
+        self.prompts = PromptEngine(self)
+        self.recognizer = sr.Recognizer()
+        self.stt = create_stt_engine()
         self.vad = webrtcvad.Vad(2)  # Aggressiveness: 0-3 (2 is balanced)
-        self.input_device_index = self._find_input_device()
+        self.vad_front = VadFrontEnd(RECORD_RATE, 16000)
+        self.capture = None
+        self.endpointer = Endpointer()
+        self.barge_in = None
     
-    def _find_input_device(self):
-        """Find the input device index for the handset microphone"""
-        print("Searching for audio input devices...")
-        target_device = None
-        
-        for i in range(self.audio.get_device_count()):
-            info = self.audio.get_device_info_by_index(i)
-            name = info.get('name', '')
-            max_inputs = info.get('maxInputChannels', 0)
-            
-            print(f"  Device {i}: {name} (inputs: {max_inputs})")
-            
-            # Look for USB audio device or card 1 (adjust if needed)
-            if max_inputs > 0:
-                if 'usb' in name.lower() or 'card 1' in name.lower():
-                    target_device = i
-                    print(f"  -> Selected as input device")
-                elif target_device is None:
-                    # Fallback to first available input
-                    target_device = i
-        
-        if target_device is None:
-            print("Warning: No input device found, using default")
-            return None
-        
-        return target_device
+    def start_capture(self):
+        """Open the handset mic for the rest of the call"""
+        if self.capture is None:
+            self.capture = CaptureStream(self.hw)
+            self.endpointer = Endpointer()
+            self.barge_in = BargeIn(self.capture) if BARGE_IN else None
+        return self.capture
+    
+    def stop_capture(self):
+        if self.barge_in is not None:
+            self.barge_in.stop()
+            self.barge_in = None
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
+            self.endpointer.summary()
     
     def play_tone(self, frequency=440, duration=0.3):
         try:
-            sample_rate = 48000
-            num_samples = int(sample_rate * duration)
-            beep_file = "/tmp/beep.wav"
-            with wave.open(beep_file, 'w') as wav_file:
-                wav_file.setnchannels(1)
-                wav_file.setsampwidth(2)
-                wav_file.setframerate(sample_rate)
-                for i in range(num_samples):
-                    fade = 1.0
-                    if i < sample_rate * 0.01:
-                        fade = i / (sample_rate * 0.01)
-                    elif i > num_samples - (sample_rate * 0.01):
-                        fade = (num_samples - i) / (sample_rate * 0.01)
-                    value = int(32767 * 0.3 * fade * math.sin(2 * math.pi * frequency * i / sample_rate))
-                    wav_file.writeframes(struct.pack('<h', value))
-            subprocess.run(["aplay", "-D", HANDSET_DEVICE, beep_file], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            os.remove(beep_file)
+            self.hw.play_pcm(tone_bank.tone(frequency, duration), OUTPUT_RATE, "handset").wait()
         except Exception as e:
             print(f"[Beep failed: {e}]")
     
-    def record_audio(self, filename="recording.wav", max_seconds=30, phone=None,
-                     silence_timeout=1.5, initial_wait=3.0):
+    def record_audio(self, max_seconds=30, phone=None, silence_timeout=None,
+                     initial_wait=3.0, preroll=CAPTURE_PREROLL, rate=STT_RATE, stream=None,
+                     on_pause=None, on_resume=None, start=None):
         """
         Record audio with voice activity detection.
-        Records at 48kHz (device native) and resamples to 16kHz for VAD.
-        Stops recording after silence_timeout seconds of silence once speech is detected.
+        Reads 48kHz frames from the call's capture stream, starting preroll
+        seconds back, and resamples to 16kHz for VAD. Frames from before the
+        recording started only count as speech if louder than the prompt's echo.
+        Stops recording after silence_timeout seconds of silence once speech is
+        detected; if it is None, the call's Endpointer picks the silence per turn.
+        Returns an sr.AudioData in memory, at 16kHz (the VAD frames) or 48kHz.
+        With a streaming recognizer session, the 16kHz frames from just before
+        speech onset onwards are also fed to it as they arrive.
+        on_pause(audio so far) is called once LLM_SPECULATE_SILENCE of trailing
+        silence has passed, and on_resume() if speech starts again after that.
+        start is a capture position to record from instead (after a barge-in).
         """
         print("Recording with VAD... Speak now!")
         
         # Record at 48kHz (device native), resample to 16kHz for VAD
-        record_rate = 48000
+        record_rate = RECORD_RATE
         vad_rate = 16000
-        downsample_factor = record_rate // vad_rate  # 3
         
-        frame_duration_ms = 30  # webrtcvad supports 10, 20, or 30 ms
-        # Frame size for recording (at 48kHz)
-        record_frame_size = int(record_rate * frame_duration_ms / 1000)  # 1440 samples
-        # Frame size for VAD (at 16kHz)
-        vad_frame_size = int(vad_rate * frame_duration_ms / 1000)  # 480 samples
+        frame_duration_ms = CAPTURE_FRAME_MS
         
         try:
-            # Open audio stream at 48kHz
-            stream = self.audio.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=record_rate,
-                input=True,
-                input_device_index=self.input_device_index,
-                frames_per_buffer=record_frame_size
-            )
+            # The mic stays open for the whole call; start reading just before now
+            capture = self.start_capture()
+            if start is None:
+                start = capture.position(preroll)
+            pos = start
+            # Frames before live were captured while the prompt was still playing
+            live = capture.position()
+            live_time = time.monotonic()
+            handset = self.hw.engine("handset")
+            coupling = self.barge_in.coupling if self.barge_in else BARGE_IN_COUPLING
+            self.vad_front.reset()
+            
+            # The 16kHz frames the VAD already produced make up the recording
+            vad_frame_bytes = vad_rate * frame_duration_ms // 1000 * 2
+            max_total_frames = int(max_seconds * 1000 / frame_duration_ms)
+            pcm_16k = bytearray(max_total_frames * vad_frame_bytes)
             
-            frames = []
             silence_frames = 0
             speech_detected = False
             initial_wait_frames = 0
+            leadin_frames = int(STT_STREAM_LEADIN * 1000 / frame_duration_ms)
+            fed_frames = None
+            pause_frames = max(1, int(LLM_SPECULATE_SILENCE * 1000 / frame_duration_ms))
+            paused = False
+            speech_frames = 0
+            speech_energy = 0.0
+            tail_energy = deque(maxlen=5)
             
             # Calculate frame limits
+            endpointer = self.endpointer if silence_timeout is None and ENDPOINT_ADAPTIVE else None
+            if silence_timeout is None:
+                silence_timeout = ENDPOINT_MAX_SILENCE
             max_silence_frames = int(silence_timeout * 1000 / frame_duration_ms)
             max_initial_frames = int(initial_wait * 1000 / frame_duration_ms)
-            max_total_frames = int(max_seconds * 1000 / frame_duration_ms)
             
-            print(f"  Max silence frames: {max_silence_frames}")
+            if endpointer:
+                print(f"  Adaptive end of turn, {ENDPOINT_MIN_SILENCE}-{ENDPOINT_MAX_SILENCE}s of silence")
+            else:
+                print(f"  Max silence frames: {max_silence_frames}")
             print(f"  Max initial wait frames: {max_initial_frames}")
             
             for frame_count in range(max_total_frames):
                 # Check for hangup
                 if phone and phone.is_on_hook():
                     print("Hung up - stopping recording")
-                    stream.stop_stream()
-                    stream.close()
                     return None
                 
-                # Read audio frame at 48kHz
-                try:
-                    frame = stream.read(record_frame_size, exception_on_overflow=False)
-                except Exception as e:
-                    print(f"Read error: {e}")
+                # View of the next 48kHz frame in the capture ring
+                frame = capture.read(pos)
+                if frame is None:
+                    print("Read error: no audio from capture stream")
                     continue
+                pos += 1
                 
-                frames.append(frame)
-                
-                # Downsample to 16kHz for VAD analysis
+                # Low-pass and downsample to 16kHz for VAD analysis
                 try:
-                    # Unpack 48kHz samples
-                    samples_48k = struct.unpack(f'{record_frame_size}h', frame)
-                    # Simple downsampling: take every 3rd sample
-                    samples_16k = samples_48k[::downsample_factor]
-                    # Pack back to bytes for VAD
-                    frame_16k = struct.pack(f'{len(samples_16k)}h', *samples_16k)
-                    
+                    frame_16k = self.vad_front.resample(frame)
+                    offset = (pos - 1 - start) * vad_frame_bytes
+                    pcm_16k[offset:offset + vad_frame_bytes] = frame_16k
                     is_speech = self.vad.is_speech(frame_16k, vad_rate)
                 except Exception as e:
                     # If VAD fails, fall back to energy detection
-                    audio_data = struct.unpack(f'{record_frame_size}h', frame)
-                    rms = math.sqrt(sum(x**2 for x in audio_data) / record_frame_size)
-                    is_speech = rms > 500
+                    is_speech = self.vad_front.rms(frame) > 500
+                
+                if is_speech and not speech_detected:
+                    # Pre-roll and the first frames after the prompt hold its echo.
+                    # They stay in the recording, but only speech clearly louder
+                    # than the echo (the same gate as BargeIn) starts the turn
+                    at = live_time - (live - pos + 1) * frame_duration_ms / 1000 if pos - 1 < live else None
+                    echo = handset.output_level(BARGE_IN_ECHO_WINDOW, at)
+                    if echo > 0:
+                        is_speech = self.vad_front.rms(frame) > max(coupling * echo * BARGE_IN_ECHO_MARGIN, 300)
+                
+                if stream is not None and (speech_detected or is_speech):
+                    recorded = pos - start
+                    if fed_frames is None:
+                        fed_frames = max(0, recorded - 1 - leadin_frames)
+                    stream.feed(memoryview(pcm_16k)[fed_frames * vad_frame_bytes:recorded * vad_frame_bytes])
+                    fed_frames = recorded
                 
                 if is_speech:
                     if not speech_detected:
                         print(f"  Speech detected at {frame_count * frame_duration_ms / 1000:.1f}s")
+                    elif endpointer and silence_frames:
+                        endpointer.add_pause(silence_frames * frame_duration_ms / 1000)
                     speech_detected = True
                     silence_frames = 0
+                    if endpointer:
+                        energy = self.vad_front.rms(frame)
+                        speech_frames += 1
+                        speech_energy += energy
+                        tail_energy.append(energy)
+                    if paused:
+                        paused = False
+                        on_resume()
                 else:
                     if speech_detected:
                         silence_frames += 1
+                        if endpointer and silence_frames == 1:
+                            # Speech so far is fixed while the silence lasts
+                            tail_ratio = np.mean(tail_energy) * speech_frames / max(speech_energy, 1.0)
+                            max_silence_frames = max(1, int(endpointer.threshold(
+                                speech_frames * frame_duration_ms / 1000, tail_ratio) * 1000 / frame_duration_ms))
+                        if on_pause and silence_frames == pause_frames and silence_frames < max_silence_frames:
+                            paused = True
+                            on_pause(sr.AudioData(bytes(pcm_16k[:(pos - start) * vad_frame_bytes]), vad_rate, 2))
                         if silence_frames >= max_silence_frames:
-                            duration = len(frames) * frame_duration_ms / 1000
+                            duration = (pos - start) * frame_duration_ms / 1000
                             print(f"  Silence detected - stopping after {duration:.1f}s")
+                            if endpointer:
+                                endpointer.end_turn(silence_frames * frame_duration_ms / 1000)
                             break
                     else:
                         # Still waiting for initial speech
@@ -425,24 +2286,22 @@ class VoiceHandler:
                             # Still save what we have in case there was quiet speech
                             break
             
-            stream.stop_stream()
-            stream.close()
-            
-            if not frames:
+            if pos == start:
                 print("No audio recorded")
                 return None
             
-            # Save the recording at 48kHz
-            with wave.open(filename, 'wb') as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)  # 16-bit
-                wf.setframerate(record_rate)
-                wf.writeframes(b''.join(frames))
+            if rate == vad_rate:
+                audio = sr.AudioData(bytes(pcm_16k[:(pos - start) * vad_frame_bytes]), vad_rate, 2)
+            else:
+                audio = sr.AudioData(capture.frames(start, pos), record_rate, 2)
+            
+            if stream is not None:
+                stream.end()
             
-            duration = len(frames) * frame_duration_ms / 1000
+            duration = (pos - start) * frame_duration_ms / 1000
             print(f"Recording complete! Duration: {duration:.1f}s")
             self.play_tone(800, 0.3)
-            return filename
+            return audio
             
         except Exception as e:
             print(f"Recording error: {e}")
@@ -472,99 +2331,292 @@ class VoiceHandler:
             print(f"Recording error: {e}")
             return None
     
-    def transcribe_audio(self, filename):
-        with sr.AudioFile(filename) as source:
-            audio = self.recognizer.record(source)
+    def listen(self, max_seconds=30, phone=None, speculation=None):
+        """
+        Record one turn and return its transcript (or an error message to say),
+        or None if nothing was recorded or the caller hung up. Streaming
+        engines recognize while the caller is talking. A SpeculativeReply is
+        told whenever the caller pauses or starts talking again. If the caller
+        talked over the last reply, the turn starts where they began.
+        """
+        stream = self.stt.stream(16000) if self.stt.streaming else None
+        audio = self.record_audio(max_seconds=max_seconds, phone=phone, stream=stream,
+                                  on_pause=(lambda audio: speculation.pause(audio, stream)) if speculation else None,
+                                  on_resume=speculation.resume if speculation else None,
+                                  start=self.barge_in.take_start() if self.barge_in else None)
+        if not audio:
+            if stream is not None:
+                stream.cancel()
+            if speculation:
+                speculation.cancel()
+            return None
+        if stream is None:
+            return self.transcribe_audio(audio)
+        try:
+            start = time.monotonic()
+            text = stream.result()
+            print(f"  Streaming transcript finished {time.monotonic() - start:.2f}s after recording")
+            return text
+        except sr.UnknownValueError:
+            return "Sorry, I couldn't understand that."
+        except sr.RequestError as e:
+            return f"Error with speech recognition: {e}"
+    
+    def transcribe_audio(self, audio):
+        """Transcribe an sr.AudioData from record_audio, or a WAV file"""
+        if isinstance(audio, str):
+            with sr.AudioFile(audio) as source:
+                audio = self.recognizer.record(source)
         try:
-            return self.recognizer.recognize_google(audio)
+            start = time.monotonic()
+            text = self.stt.transcribe(audio)
+            print(f"  Transcribed by {self.stt.name} in {time.monotonic() - start:.2f}s")
+            return text
         except sr.UnknownValueError:
             return "Sorry, I couldn't understand that."
         except sr.RequestError as e:
             return f"Error with speech recognition: {e}"
     
-    def text_to_speech(self, text, output_file="response.wav"):
+    def text_to_speech(self, text, output_file=None):
+        """
+        Render text with espeak. Without output_file the clip comes from (or goes
+        into) the TTS cache and must not be deleted by the caller.
+        """
         cleaned_text = text.replace('*', '').replace('_', '').replace('#', '')
         cleaned_text = cleaned_text.replace('[', '').replace(']', '')
         cleaned_text = cleaned_text.replace('(', '').replace(')', '')
         cleaned_text = cleaned_text.replace('{', '').replace('}', '')
         cleaned_text = cleaned_text.replace('`', '').replace('~', '')
         cleaned_text = ' '.join(cleaned_text.split())
-        subprocess.run(["espeak", "-v", "en-us", "-s", "150", "-w", output_file, cleaned_text])
-        return output_file
+        if output_file:
+            self._espeak(cleaned_text, output_file)
+            return output_file
+        key = self.tts_cache.key(cleaned_text, TTS_VOICE, TTS_RATE)
+        cached = self.tts_cache.get(key)
+        if cached:
+            return cached
+        temp_file = self.tts_cache.temp_path(key)
+        self._espeak(cleaned_text, temp_file)
+        return self.tts_cache.put(key, temp_file)
+    
+    def _espeak(self, text, output_file):
+        subprocess.run(["espeak", "-v", TTS_VOICE, "-s", str(TTS_RATE), "-w", output_file, text])
+    
+    def prewarm(self, prompts):
+        """Render prompts into the TTS cache on a background thread"""
+        def render():
+            start = time.monotonic()
+            for prompt in prompts:
+                try:
+                    self.text_to_speech(prompt)
+                except Exception as e:
+                    print(f"TTS prewarm error: {e}")
+            print(f"TTS cache warm ({len(prompts)} prompts, {time.monotonic() - start:.1f}s)")
+        threading.Thread(target=render, daemon=True).start()
+    
+    def say(self, text, phone=None, cache=True):
+        """Speak text on the handset. Returns False if the caller hung up."""
+        if cache:
+            return self.play_audio(self.text_to_speech(text), check_hangup=True, phone=phone)
+        audio = self.text_to_speech(text, f"speech_{threading.get_ident()}.wav")
+        played = self.play_audio(audio, check_hangup=True, phone=phone)
+        os.remove(audio)
+        return played
     
-    def play_audio(self, filename, check_hangup=False, phone=None, device="handset"):
+    def play_audio(self, filename, check_hangup=False, phone=None, device="handset", interrupt=None):
         print(f"Playing: {filename}")
-        audio_device = HANDSET_DEVICE if device == "handset" else INTERNAL_DEVICE
         try:
-            subprocess.run(["amixer", "-c", "1" if device == "handset" else "0", "set", "PCM", "100%"],
-                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            if check_hangup and phone:
-                process = subprocess.Popen(["aplay", "-D", audio_device, filename],
-                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                while process.poll() is None:
-                    if phone.is_on_hook():
-                        process.terminate()
-                        print("Hung up - stopping audio")
-                        return False
-                    time.sleep(0.05)
-                return True
-            else:
-                subprocess.run(["aplay", "-D", audio_device, filename], check=True)
-                return True
+            return self._wait_playback(self.hw.play(filename, device), check_hangup, phone, interrupt)
         except Exception as e:
             print(f"Playback error: {e}")
             return True
     
-    def play_on_internal(self, filename, phone=None):
-        print(f"Playing on internal speaker: {filename}")
-        vol = get_internal_volume()
+    def play_pcm(self, pcm, rate, check_hangup=False, phone=None, device="handset"):
+        """Play mono 16-bit PCM straight from memory"""
         try:
-            subprocess.run(["amixer", "-c", "0", "set", "PCM", "100%"],
-                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            if filename.lower().endswith(('.mp3', '.mp4')):
-                temp_wav = "/tmp/internal_temp.wav"
-                temp_loud = "/tmp/internal_loud.wav"
-                subprocess.run(["mpg123", "-q", "-w", temp_wav, filename], check=True)
-                subprocess.run(["sox", temp_wav, temp_loud, "vol", str(vol)], check=True)
-                process = subprocess.Popen(["aplay", "-D", INTERNAL_DEVICE, temp_loud],
-                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                while process.poll() is None:
-                    if phone and phone.is_off_hook():
-                        process.terminate()
-                        print("Picked up - stopping internal audio")
-                        break
-                    time.sleep(0.05)
-                try:
-                    os.remove(temp_wav)
-                    os.remove(temp_loud)
-                except:
-                    pass
-            else:
-                temp_loud = "/tmp/internal_loud.wav"
-                subprocess.run(["sox", filename, temp_loud, "vol", str(vol)], check=True)
-                process = subprocess.Popen(["aplay", "-D", INTERNAL_DEVICE, temp_loud],
-                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                while process.poll() is None:
-                    if phone and phone.is_off_hook():
-                        process.terminate()
-                        print("Picked up - stopping internal audio")
-                        break
-                    time.sleep(0.05)
-                try:
-                    os.remove(temp_loud)
-                except:
-                    pass
+            return self._wait_playback(self.hw.play_pcm(pcm, rate, device), check_hangup, phone)
         except Exception as e:
-            print(f"Internal playback error: {e}")
+            print(f"Playback error: {e}")
+            return True
     
-    def cleanup(self):
-        self.audio.terminate()
+    def _wait_playback(self, process, check_hangup, phone, interrupt=None):
+        """Returns False if the caller hung up; an interrupt Event being set stops playback early"""
+        if check_hangup and phone:
+            while process.poll() is None:
+                if phone.is_on_hook():
+                    process.terminate()
+                    print("Hung up - stopping audio")
+                    return False
+                if interrupt is not None and interrupt.is_set():
+                    process.terminate()
+                    return True
+                time.sleep(0.01)
+            return True
+        process.wait()
+        return True
+    
+class HttpClient:
+    """
+    One pooled requests.Session shared by every outbound HTTP call.
+    Connections are kept alive and reused, up to HTTP_MAX_PER_HOST per host.
+    Requests beyond that (a reply, summary, keep-alive ping and speculative
+    reply can all be in flight to the LLM host) get a new connection that is
+    closed afterwards rather than waiting for a free one. Connect and read
+    timeouts are separate, and connection failures are retried with jittered
+    exponential backoff.
+    """
+    def __init__(self):
+        self.session = requests.Session()
+        self.adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=HTTP_MAX_PER_HOST,
+                                                     pool_block=False)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.retries = 0
+    
+    def request(self, method, url, timeout=HTTP_READ_TIMEOUT, retries=HTTP_RETRIES, **kwargs):
+        for attempt in range(retries + 1):
+            try:
+                response = self.session.request(method, url, timeout=(HTTP_CONNECT_TIMEOUT, timeout), **kwargs)
+                if response.status_code not in HTTP_RETRY_STATUS or attempt == retries:
+                    return response
+                response.close()
+                reason = f"HTTP {response.status_code}"
+            except requests.ConnectionError as e:
+                # Includes connect timeouts and keep-alive connections the server
+                # already closed; read timeouts are not retried
+                if attempt == retries:
+                    raise
+                reason = e.__class__.__name__
+            self.retries += 1
+            delay = random.uniform(0, HTTP_BACKOFF * (2 ** attempt))
+            print(f"  Retrying {url} in {delay:.2f}s ({reason})")
+            time.sleep(delay)
+    
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+    
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+    
+    def stats(self):
+        """Connection reuse counters summed over every host pool"""
+        requests_sent = 0
+        connections = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            requests_sent += pool.num_requests
+            connections += pool.num_connections
+        return {"requests": requests_sent, "connections": connections,
+                "reused": requests_sent - connections, "retries": self.retries}
+    
+    def print_stats(self):
+        stats = self.stats()
+        print(f"HTTP: {stats['requests']} requests over {stats['connections']} connections "
+              f"({stats['reused']} reused, {stats['retries']} retries)")
+
+http_client = HttpClient()
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+
+class LLMReply:
+    """
+    One streamed LLM reply, generated on a background thread without touching
+    the conversation history. Iterating yields complete sentences as they
+    arrive. cancel() closes the HTTP stream, and LLMHandler.commit() adds the
+    exchange to the history once the reply has actually been used. heard is
+    the part the caller got to hear, if they cut it short.
+    """
+    def __init__(self, llm, message):
+        self.llm = llm
+        self.message = message
+        self.sentences = queue.Queue()
+        self.text = ""
+        self.final = None
+        self.cancelled = False
+        self.heard = None
+        self.response = None
+        self.started = time.monotonic()
+        self.url, self.payload = llm._request(stream=True, pending=message)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def _run(self):
+        pending = ""
+        try:
+            response = http_client.post(self.url, json=self.payload, stream=True, timeout=30)
+            self.response = response
+            if self.cancelled:
+                response.close()
+                return
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if self.cancelled:
+                    break
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                token = self.llm._response_text(chunk)
+                self.text += token
+                pending += token
+                sentences = SENTENCE_END.split(pending)
+                pending = sentences.pop()
+                for sentence in sentences:
+                    if sentence.strip():
+                        self.sentences.put(sentence.strip())
+                if chunk.get("done"):
+                    # Keep reading to the end of the body so the connection
+                    # goes back to the pool instead of being dropped
+                    self.final = chunk
+            if pending.strip() and not self.cancelled:
+                self.sentences.put(pending.strip())
+        except Exception as e:
+            if not self.cancelled:
+                print(f"Error communicating with LLM: {e}")
+                if not self.text:
+                    self.sentences.put("Sorry, I'm having trouble connecting right now.")
+        finally:
+            self.response = None
+            self.sentences.put(None)
+    
+    def __iter__(self):
+        while True:
+            sentence = self.sentences.get()
+            if sentence is None or self.cancelled:
+                return
+            yield sentence
+    
+    def cancel(self):
+        self.cancelled = True
+        response = self.response
+        if response is not None:
+            try:
+                response.close()
+            except:
+                pass
 
 class LLMHandler:
-    def __init__(self, api_url, model):
+    def __init__(self, api_url, model, chat_url=None):
         self.api_url = api_url
+        self.chat_url = chat_url
         self.model = model
         self.conversation_history = []
+        self.summary = ""
+        self.evicted = []
+        self.summary_lock = threading.Lock()
+        self.summary_thread = None
+        self.chars_per_token = 4.0
+        self.prompt_chars = 0
+        self.turn_stats = []
+        self.active_reply = None
+        self.cancelled = False
+        self.warm_lock = threading.Lock()
+        self.warming = False
+        self.last_warm = float("-inf")
+        self.warm_times = {"cold": [], "warm": []}
         self.system_prompt = """You are an AI assistant on a rotary phone call. Keep these guidelines in mind:
 - Keep responses concise and conversational (2-4 sentences typically)
 - Speak naturally as if on a phone call
@@ -573,26 +2625,222 @@ class LLMHandler:
 - If asked how to end the call, tell them to say "goodbye" or "hang up"
 - Be helpful, friendly, and to the point"""
     
+    def _request(self, stream, pending=None):
+        """
+        Returns (url, payload) for the next turn in chat or generate mode.
+        pending is a user message sent after the history without being added to it.
+        """
+        self.prompt_chars = self._prompt_chars(pending)
+        if self.chat_url:
+            return self.chat_url, {"model": self.model, "messages": self._build_messages(pending), "stream": stream,
+                                   "keep_alive": LLM_KEEP_ALIVE}
+        return self.api_url, {"model": self.model, "prompt": self._build_prompt(pending), "stream": stream,
+                              "keep_alive": LLM_KEEP_ALIVE}
+    
+    def _response_text(self, result):
+        if self.chat_url:
+            return result.get("message", {}).get("content", "")
+        return result.get("response", "")
+    
     def send_message(self, message):
         print(f"Sending to LLM: {message}")
         self.conversation_history.append({"role": "user", "content": message})
-        prompt = self._build_prompt()
-        payload = {"model": self.model, "prompt": prompt, "stream": False}
+        url, payload = self._request(stream=False)
         try:
-            response = requests.post(self.api_url, json=payload, timeout=30)
+            response = http_client.post(url, json=payload, timeout=30)
             response.raise_for_status()
             result = response.json()
-            llm_response = result.get("response", "Sorry, I didn't get a response.")
+            llm_response = self._response_text(result) or "Sorry, I didn't get a response."
             self.conversation_history.append({"role": "assistant", "content": llm_response})
             print(f"LLM Response: {llm_response}")
+            self._record_stats(result)
+            self._trim_history()
             return llm_response
         except Exception as e:
             print(f"Error communicating with LLM: {e}")
             return "Sorry, I'm having trouble connecting right now."
     
-    def _build_prompt(self):
-        prompt = self.system_prompt + "\n\n"
-        for msg in self.conversation_history:
+    def stream_message(self, message, reply=None, commit=True):
+        """
+        Like send_message, but streams the reply from Ollama and yields it one
+        sentence at a time as soon as each sentence is complete. reply can be
+        an LLMReply already started for this message (see SpeculativeReply).
+        cancel() from another thread closes the HTTP stream. With commit=False
+        the caller commits the reply once it knows how much was heard.
+        """
+        print(f"Streaming from LLM: {message}")
+        self.cancelled = False
+        reply = reply or self.start_reply(message)
+        self.active_reply = reply
+        try:
+            for sentence in reply:
+                yield sentence
+        finally:
+            self.active_reply = None
+            if commit:
+                self.commit(reply)
+    
+    def warm(self, reason="pickup"):
+        """
+        Load the model on the server (and keep it loaded for LLM_KEEP_ALIVE) on a
+        background thread, so the first turn doesn't pay for it. Skipped if a
+        warm-up is in flight or finished in the last 30 seconds.
+        """
+        with self.warm_lock:
+            if self.warming or time.monotonic() - self.last_warm < 30:
+                return
+            self.warming = True
+        threading.Thread(target=self._warm, args=(reason,), daemon=True).start()
+    
+    def _warm(self, reason):
+        start = time.monotonic()
+        try:
+            # A generate request without a prompt only loads the model
+            response = http_client.post(self.api_url, json={"model": self.model, "keep_alive": LLM_KEEP_ALIVE},
+                                        timeout=60)
+            response.raise_for_status()
+            result = response.json()
+            elapsed = time.monotonic() - start
+            kind = "cold" if elapsed > LLM_COLD_START else "warm"
+            self.warm_times[kind].append(elapsed)
+            load = result.get("load_duration")
+            print(f"LLM warm-up ({reason}): {kind}, {elapsed:.2f}s" +
+                  (f" (model load {load / 1e9:.2f}s)" if load else ""))
+        except Exception as e:
+            print(f"LLM warm-up error: {e}")
+        finally:
+            with self.warm_lock:
+                self.warming = False
+                self.last_warm = time.monotonic()
+    
+    def start_keepalive(self):
+        """Ping the server every LLM_WARM_INTERVAL during CALL_HOURS so the model stays loaded"""
+        def run():
+            while True:
+                if in_call_hours():
+                    self.warm("schedule")
+                time.sleep(LLM_WARM_INTERVAL)
+        threading.Thread(target=run, daemon=True).start()
+    
+    def print_warm_stats(self):
+        for kind, times in self.warm_times.items():
+            if times:
+                print(f"LLM {kind} starts: {len(times)}, median {np.median(times):.2f}s, max {max(times):.2f}s")
+    
+    def start_reply(self, message):
+        """Start generating a reply to message without adding it to the conversation yet"""
+        return LLMReply(self, message)
+    
+    def commit(self, reply):
+        """Add a used reply (and the message it answers) to the conversation"""
+        self.conversation_history.append({"role": "user", "content": reply.message})
+        response_text = (reply.text if reply.heard is None else reply.heard).strip()
+        if response_text:
+            self.conversation_history.append({"role": "assistant", "content": response_text})
+        if reply.final:
+            self._record_stats(reply.final)
+        print(f"LLM Response{' (cancelled)' if reply.cancelled else ''}: {response_text}")
+        self._trim_history()
+    
+    def cancel(self):
+        self.cancelled = True
+        reply = self.active_reply
+        if reply is not None:
+            reply.cancel()
+    
+    def _record_stats(self, result):
+        """Log per-turn token counts and calibrate the chars-per-token estimate"""
+        prompt_tokens = result.get("prompt_eval_count")
+        eval_tokens = result.get("eval_count")
+        if prompt_tokens is None and eval_tokens is None:
+            return
+        prefill_ms = result.get("prompt_eval_duration", 0) / 1e6
+        eval_ms = result.get("eval_duration", 0) / 1e6
+        self.turn_stats.append({"prompt_tokens": prompt_tokens, "eval_tokens": eval_tokens,
+                                "prefill_ms": prefill_ms, "eval_ms": eval_ms})
+        print(f"  LLM turn {len(self.turn_stats)}: prompt {prompt_tokens} tokens ({prefill_ms:.0f} ms), "
+              f"eval {eval_tokens} tokens ({eval_ms:.0f} ms)")
+        # Ollama only counts the uncached part of the prompt, so only a full
+        # prefill tells us anything about the tokenizer
+        if prompt_tokens and prompt_tokens * 2 > self._estimate_tokens(self.prompt_chars):
+            self.chars_per_token = 0.8 * self.chars_per_token + 0.2 * (self.prompt_chars / prompt_tokens)
+    
+    def _estimate_tokens(self, chars):
+        return chars / self.chars_per_token
+    
+    def _prompt_chars(self, pending=None):
+        chars = len(self._system_content()) + (len(pending) + 8 if pending else 0)
+        return chars + sum(len(msg["content"]) + 8 for msg in self.conversation_history)
+    
+    def _history_tokens(self):
+        return self._estimate_tokens(self._prompt_chars())
+    
+    def _trim_history(self):
+        """
+        Keep the prompt within LLM_CONTEXT_TOKENS. Once over budget, the oldest
+        turns are dropped down to LLM_TRIM_TARGET of the budget in one go, so the
+        prompt prefix (and the server's prompt cache) stays stable for several
+        turns. Dropped turns are folded into a rolling summary in the background.
+        """
+        if self._history_tokens() <= LLM_CONTEXT_TOKENS:
+            return
+        keep = LLM_KEEP_MESSAGES
+        dropped = []
+        while len(self.conversation_history) > keep and \
+                self._history_tokens() > LLM_CONTEXT_TOKENS * LLM_TRIM_TARGET:
+            dropped.append(self.conversation_history.pop(0))
+        if not dropped:
+            return
+        print(f"  Trimmed {len(dropped)} old messages from LLM context")
+        with self.summary_lock:
+            self.evicted += dropped
+            if self.summary_thread is None or not self.summary_thread.is_alive():
+                self.summary_thread = threading.Thread(target=self._summarize, daemon=True)
+                self.summary_thread.start()
+    
+    def _summarize(self):
+        while True:
+            with self.summary_lock:
+                turns = self.evicted
+                self.evicted = []
+                previous = self.summary
+            if not turns:
+                return
+            transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in turns)
+            prompt = ("Summarize this phone conversation in two or three sentences. "
+                      "Keep names, facts and anything the caller asked for.\n\n")
+            if previous:
+                prompt += f"Earlier summary: {previous}\n\n"
+            payload = {"model": self.model, "stream": False,
+                       "messages": [{"role": "user", "content": prompt + transcript}]}
+            try:
+                response = http_client.post(self.chat_url or self.api_url.replace("/api/generate", "/api/chat"),
+                                         json=payload, timeout=30)
+                response.raise_for_status()
+                summary = response.json().get("message", {}).get("content", "").strip()
+                if summary:
+                    with self.summary_lock:
+                        self.summary = summary
+                    print(f"  Conversation summary: {summary}")
+            except Exception as e:
+                print(f"Error summarizing conversation: {e}")
+    
+    def _system_content(self):
+        if self.summary:
+            return f"{self.system_prompt}\n\nEarlier in this call: {self.summary}"
+        return self.system_prompt
+    
+    def _history(self, pending=None):
+        if pending:
+            return self.conversation_history + [{"role": "user", "content": pending}]
+        return self.conversation_history
+    
+    def _build_messages(self, pending=None):
+        return [{"role": "system", "content": self._system_content()}] + self._history(pending)
+    
+    def _build_prompt(self, pending=None):
+        prompt = self._system_content() + "\n\n"
+        for msg in self._history(pending):
             if msg["role"] == "user":
                 prompt += f"User: {msg['content']}\n"
             else:
@@ -601,6 +2849,10 @@ class LLMHandler:
     
     def reset_conversation(self):
         self.conversation_history = []
+        with self.summary_lock:
+            self.summary = ""
+            self.evicted = []
+        self.turn_stats = []
 
 def find_offhook_audio():
     usb_locations = ["/mnt/usb", "/media/pi", "/media/usb0", "/media/usb"]
@@ -615,21 +2867,9 @@ def find_offhook_audio():
     print("offhook.mp3 not found on USB drive")
     return None
 
-def get_random_simpsons_clip():
-    simpsons_folder = "/mnt/usb/Simpsons"
-    if not os.path.exists(simpsons_folder):
-        simpsons_folder = "/mnt/usb/simpsons"
-    if not os.path.exists(simpsons_folder):
-        return None
-    audio_extensions = ('.mp3', '.wav', '.ogg', '.m4a')
-    audio_files = [f for f in os.listdir(simpsons_folder) if f.lower().endswith(audio_extensions)]
-    if audio_files:
-        return os.path.join(simpsons_folder, random.choice(audio_files))
-    return None
-
 def get_dad_joke():
     try:
-        response = requests.get("https://icanhazdadjoke.com/", headers={"Accept": "application/json"}, timeout=10)
+        response = http_client.get("https://icanhazdadjoke.com/", headers={"Accept": "application/json"}, timeout=10)
         if response.status_code == 200:
             return response.json().get("joke", "I couldn't think of a joke.")
         return "Sorry, the joke service is unavailable."
@@ -638,7 +2878,7 @@ def get_dad_joke():
 
 def get_random_fact():
     try:
-        response = requests.get("https://uselessfacts.jsph.pl/random.json?language=en", timeout=10)
+        response = http_client.get("https://uselessfacts.jsph.pl/random.json?language=en", timeout=10)
         if response.status_code == 200:
             return response.json().get("text", "I couldn't find a fact.")
         return "Sorry, the facts service is unavailable."
@@ -647,7 +2887,7 @@ def get_random_fact():
 
 def get_this_day_in_history():
     try:
-        response = requests.get("http://history.muffinlabs.com/date", timeout=10)
+        response = http_client.get("http://history.muffinlabs.com/date", timeout=10)
         if response.status_code == 200:
             data = response.json().get("data", {})
             events = data.get("Events", [])
@@ -663,7 +2903,7 @@ def get_this_day_in_history():
 def get_weather(location="Knox, Indiana"):
     try:
         url = f"http://wttr.in/{location.replace(' ', '_').replace(',', '')}?format=%C|%t|%w"
-        response = requests.get(url, timeout=10)
+        response = http_client.get(url, timeout=10)
         if response.status_code == 200:
             weather_data = response.text.strip()
             parts = weather_data.split('|')
@@ -680,40 +2920,19 @@ def get_weather(location="Knox, Indiana"):
         return "Sorry, the weather service is currently unavailable."
 
 def play_directory(voice, phone):
-    directory = """Directory of services:
-    Dial 4 1 1 for AI assistant.
-    Dial 6 1 1 for music directory.
-    Dial 7 4 2 for Simpsons soundboard.
-    Dial 7 8 6 for shuffle all music.
-    Dial 8 4 6 to set a timer.
-    Dial 8 6 5 to set internal speaker volume.
-    Dial 5 5 5 1 2 1 2 for weather.
-    Dial 5 5 5 3 6 5 3 for a dad joke.
-    Dial 5 5 5 3 2 2 8 for a random fact.
-    Dial 5 5 5 3 2 8 3 for this day in history.
-    Dial 0 to hear this directory again."""
-    dir_audio = voice.text_to_speech(directory, "directory.wav")
-    voice.play_audio(dir_audio, check_hangup=True, phone=phone)
-    os.remove(dir_audio)
+    voice.say(DIRECTORY, phone)
 
 def play_music_directory(voice, phone):
-    dir_audio = voice.text_to_speech(MUSIC_DIRECTORY, "music_directory.wav")
-    voice.play_audio(dir_audio, check_hangup=True, phone=phone)
-    os.remove(dir_audio)
+    voice.say(MUSIC_DIRECTORY, phone)
 
 def play_ring_and_wait(ring_audio, phone, timeout=20):
-    if not ring_audio:
-        return False
-    
     print("RINGING...")
     vol = get_internal_volume()
-    
-    temp_wav = "/tmp/ring_temp.wav"
-    temp_loud = "/tmp/ring_loud.wav"
+    if not ring_audio:
+        return play_ring_tone_and_wait(phone, vol, timeout)
     
     try:
-        subprocess.run(["mpg123", "-q", "-w", temp_wav, ring_audio], check=True)
-        subprocess.run(["sox", temp_wav, temp_loud, "vol", str(vol)], check=True)
+        pcm = asset_cache.get(ring_audio, "internal")
     except:
         return False
     
@@ -721,15 +2940,14 @@ def play_ring_and_wait(ring_audio, phone, timeout=20):
     picked_up = False
     
     while time.time() - start_time < timeout:
-        process = subprocess.Popen(["aplay", "-D", INTERNAL_DEVICE, temp_loud],
-                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        process = phone.hw.play_pcm(pcm, OUTPUT_RATE, "internal")
         
         while process.poll() is None:
             if phone.is_off_hook():
                 process.terminate()
                 picked_up = True
                 break
-            time.sleep(0.05)
+            time.sleep(0.01)
         
         if picked_up:
             break
@@ -744,84 +2962,326 @@ def play_ring_and_wait(ring_audio, phone, timeout=20):
         if picked_up:
             break
     
+    print("Picked up!" if picked_up else "No answer")
+    return picked_up
+
+def speak_llm_response(voice, llm, message, phone, reply=None):
+    """
+    Stream an LLM reply and speak it sentence by sentence. A worker thread
+    synthesizes each sentence as it arrives and queues it while this thread
+    plays whatever is ready. Hanging up cancels the HTTP stream and drops
+    the queued audio, and so does the caller talking over the reply (only
+    what they heard goes into the history). reply is an LLMReply already in
+    flight for message, if there is one. Returns False if the caller hung up.
+    """
+    clips = queue.Queue()
+    start = time.monotonic()
+    reply = reply or llm.start_reply(message)
+    
+    def produce():
+        stream = llm.stream_message(message, reply, commit=False)
+        try:
+            for i, sentence in enumerate(stream):
+                if llm.cancelled:
+                    break
+                clips.put((sentence, voice.text_to_speech(sentence, f"sentence_{i}.wav")))
+        finally:
+            stream.close()
+            clips.put(None)
+    
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    barge = voice.barge_in
+    if barge is not None:
+        barge.watch(phone.hw.engine("handset"))
+    spoken = []
+    first_clip = True
+    completed = True
+    interrupted = False
     try:
-        os.remove(temp_wav)
-        os.remove(temp_loud)
-    except:
-        pass
+        while True:
+            try:
+                item = clips.get(timeout=0.05)
+            except queue.Empty:
+                if phone.is_on_hook():
+                    completed = False
+                    break
+                if barge is not None and barge.triggered.is_set():
+                    interrupted = True
+                    break
+                continue
+            if item is None:
+                break
+            sentence, clip = item
+            if first_clip:
+                print(f"  First audio after {time.monotonic() - start:.2f}s")
+                first_clip = False
+            spoken.append(sentence)
+            played = voice.play_audio(clip, check_hangup=True, phone=phone,
+                                      interrupt=barge.triggered if barge is not None else None)
+            os.remove(clip)
+            if not played:
+                completed = False
+                break
+            if barge is not None and barge.triggered.is_set():
+                interrupted = True
+                break
+    finally:
+        if barge is not None:
+            barge.stop()
+    
+    if not completed or interrupted:
+        if interrupted:
+            print(f"Caller interrupted after {time.monotonic() - start:.2f}s - cancelling LLM stream")
+            reply.heard = " ".join(spoken)
+        else:
+            print("Hung up - cancelling LLM stream")
+        llm.cancel()
+        worker.join(timeout=5)
+        while True:
+            try:
+                item = clips.get_nowait()
+            except queue.Empty:
+                break
+            if item:
+                try:
+                    os.remove(item[1])
+                except:
+                    pass
+    else:
+        worker.join(timeout=5)
+    llm.commit(reply)
+    return completed
+
+class SpeculativeReply:
+    """
+    Starts transcribing and the LLM reply as soon as the caller pauses, while
+    record_audio is still waiting out the end-of-turn silence. If the caller
+    talks again the speculative work is cancelled and the next pause starts
+    it over. take() hands the in-flight reply over if it was started for the
+    same message as the final transcript.
+    """
+    def __init__(self, voice, llm, prefix=""):
+        self.voice = voice
+        self.llm = llm
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.message = None
+        self.reply = None
+        self.thread = None
+    
+    def pause(self, audio, stream=None):
+        """
+        The caller paused after audio. With a streaming recognizer session the
+        text comes from what it has decoded so far instead of a second decode.
+        """
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        self.thread = threading.Thread(target=self._start, args=(audio, stream, generation), daemon=True)
+        self.thread.start()
+    
+    def _start(self, audio, stream, generation):
+        try:
+            text = stream.current() if stream is not None else self.voice.stt.transcribe(audio)
+        except Exception:
+            return
+        if not text:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.message = self.prefix + text
+            self.reply = self.llm.start_reply(self.message)
+        print(f"  Speculating on: {text}")
+    
+    def _drop(self):
+        with self.lock:
+            self.generation += 1
+            reply = self.reply
+            self.reply = None
+            self.message = None
+        if reply is not None:
+            reply.cancel()
+        return reply
+    
+    def resume(self):
+        if self._drop() is not None:
+            print("  Caller kept talking - cancelled speculative reply")
+    
+    def cancel(self):
+        self._drop()
+    
+    def take(self, message):
+        """The speculative LLMReply for message, or None (and any other one is cancelled)"""
+        thread = self.thread
+        if thread is not None:
+            thread.join(timeout=2)
+        with self.lock:
+            reply, speculated = self.reply, self.message
+            if speculated is not None and speculated.lower().strip() == message.lower().strip():
+                self.reply = None
+                self.message = None
+                self.generation += 1
+                print(f"  Speculative reply hit ({time.monotonic() - reply.started:.2f}s head start)")
+                return reply
+        self.cancel()
+        return None
+
+class CallOpener:
+    """
+    The opening line of an incoming call, prepared while the phone rings: the
+    reply is generated (without touching the history) and rendered to speech
+    on a background thread. ready() waits for it once someone picks up and
+    commits it to the conversation; discard() drops it if nobody answers.
+    """
+    def __init__(self, voice, llm, message):
+        self.voice = voice
+        self.llm = llm
+        self.message = message
+        self.reply = llm.start_reply(message)
+        self.audio = None
+        self.discarded = False
+        self.thread = threading.Thread(target=self._prepare, daemon=True)
+        self.thread.start()
+    
+    def _prepare(self):
+        start = time.monotonic()
+        text = " ".join(self.reply)
+        if self.discarded or not text:
+            return
+        try:
+            audio = self.voice.text_to_speech(text, f"opener_{threading.get_ident()}.wav")
+        except Exception as e:
+            print(f"Opener TTS error: {e}")
+            return
+        if self.discarded:
+            os.remove(audio)
+            return
+        self.audio = audio
+        print(f"  Opener ready {time.monotonic() - start:.1f}s into the ring: {text}")
+    
+    def ready(self, timeout=35):
+        """The rendered opener (to be played and deleted by the caller), or None if it failed"""
+        self.thread.join(timeout)
+        if self.audio is None:
+            self.discard()
+            return None
+        self.llm.commit(self.reply)
+        return self.audio
     
+    def discard(self):
+        self.discarded = True
+        self.reply.cancel()
+        self.thread.join(timeout=5)
+        if self.audio:
+            try:
+                os.remove(self.audio)
+            except:
+                pass
+            self.audio = None
+
+def play_ring_tone_and_wait(phone, vol, timeout=20):
+    """Ring with the synthesized ringback cadence when ring.mp3 is missing"""
+    player = phone.hw.play_pcm(tone_bank.cadence("ringback", level=min(0.9, 0.3 * vol)), OUTPUT_RATE, "internal", loop=True)
+    start_time = time.time()
+    picked_up = False
+    while time.time() - start_time < timeout:
+        if phone.is_off_hook():
+            picked_up = True
+            break
+        time.sleep(0.05)
+    player.terminate()
+    player.wait(timeout=1)
     print("Picked up!" if picked_up else "No answer")
     return picked_up
 
 def handle_incoming_call(phone, voice, llm, ring_audio):
     print("\n=== INCOMING CALL ===")
     
-    if play_ring_and_wait(ring_audio, phone, timeout=20):
-        time.sleep(0.5)
-        
-        scenario = random.choice(CALL_SCENARIOS)
-        
-        llm.conversation_history = []
-        llm.system_prompt = f"""You are making a phone call. {scenario}
+    scenario = random.choice(CALL_SCENARIOS)
+    
+    llm.reset_conversation()
+    llm.system_prompt = f"""You are making a phone call. {scenario}
 Keep your responses short and conversational (1-3 sentences).
 Stay in character throughout the call.
 Don't use special characters or formatting.
 If they seem confused or want to end the call, politely say goodbye."""
+    
+    # Write and record the opening line while the phone is still ringing
+    opener = CallOpener(voice, llm, "You just called and someone picked up. Start the conversation.")
+    
+    if play_ring_and_wait(ring_audio, phone, timeout=20):
+        voice.start_capture()
+        time.sleep(0.5)
         
-        opener = llm.send_message("You just called and someone picked up. Start the conversation.")
-        opener_audio = voice.text_to_speech(opener, "caller_opener.wav")
-        voice.play_audio(opener_audio, check_hangup=True, phone=phone)
-        os.remove(opener_audio)
+        audio = opener.ready()
+        if audio:
+            voice.play_audio(audio, check_hangup=True, phone=phone)
+            os.remove(audio)
+        else:
+            voice.say(llm.send_message(opener.message), phone, cache=False)
         
+        speculation = SpeculativeReply(voice, llm, "They said: ") if LLM_STREAMING and LLM_SPECULATE else None
         turn = 0
         while turn < 10 and phone.is_off_hook():
             turn += 1
             
-            audio_file = voice.record_audio(max_seconds=30, phone=phone)
-            if not audio_file:
+            user_msg = voice.listen(max_seconds=30, phone=phone, speculation=speculation)
+            if user_msg is None:
                 break
             
-            user_msg = voice.transcribe_audio(audio_file)
             print(f"You said: {user_msg}")
+            reply = speculation.take(f"They said: {user_msg}") if speculation else None
             
             if any(kw in user_msg.lower() for kw in ["goodbye", "bye", "hang up", "go away", "stop calling"]):
-                bye = llm.send_message(f"They said: {user_msg}. Say a brief goodbye and end the call.")
-                bye_audio = voice.text_to_speech(bye, "caller_bye.wav")
-                voice.play_audio(bye_audio, check_hangup=True, phone=phone)
-                os.remove(bye_audio)
-                os.remove(audio_file)
+                if reply:
+                    reply.cancel()
+                bye_msg = f"They said: {user_msg}. Say a brief goodbye and end the call."
+                if LLM_STREAMING:
+                    speak_llm_response(voice, llm, bye_msg, phone)
+                else:
+                    bye = llm.send_message(bye_msg)
+                    voice.say(bye, phone, cache=False)
                 break
             
             if user_msg and "couldn't understand" not in user_msg:
-                resp = llm.send_message(f"They said: {user_msg}")
-                resp_audio = voice.text_to_speech(resp, "caller_resp.wav")
-                voice.play_audio(resp_audio, check_hangup=True, phone=phone)
-                os.remove(resp_audio)
-            
-            os.remove(audio_file)
+                if LLM_STREAMING:
+                    speak_llm_response(voice, llm, f"They said: {user_msg}", phone, reply)
+                else:
+                    resp = llm.send_message(f"They said: {user_msg}")
+                    voice.say(resp, phone, cache=False)
         
-        llm.system_prompt = """You are an AI assistant on a rotary phone call. Keep these guidelines in mind:
+        voice.stop_capture()
+        restore_assistant_prompt(llm)
+        
+        http_client.print_stats()
+        phone.hw.print_audio_stats()
+        print("=== INCOMING CALL ENDED ===\n")
+        return True
+    
+    opener.discard()
+    restore_assistant_prompt(llm)
+    return False
+
+def restore_assistant_prompt(llm):
+    llm.system_prompt = """You are an AI assistant on a rotary phone call. Keep these guidelines in mind:
 - Keep responses concise and conversational (2-4 sentences typically)
 - Speak naturally as if on a phone call
 - Avoid using special characters, asterisks, markdown formatting, or symbols
 - Don't use lists or bullet points - speak in natural sentences
 - If asked how to end the call, tell them to say "goodbye" or "hang up"
 - Be helpful, friendly, and to the point"""
-        llm.conversation_history = []
-        
-        print("=== INCOMING CALL ENDED ===\n")
-        return True
-    
-    return False
+    llm.reset_conversation()
+
 
 def handle_timer_ring(phone, voice, ring_audio):
     print("\n=== TIMER ALARM ===")
     
     if play_ring_and_wait(ring_audio, phone, timeout=30):
         time.sleep(0.5)
-        msg = voice.text_to_speech("Your timer is complete!", "timer_done.wav")
-        voice.play_audio(msg, check_hangup=True, phone=phone)
-        os.remove(msg)
+        voice.say("Your timer is complete!", phone)
         print("=== TIMER ACKNOWLEDGED ===\n")
     else:
         print("=== TIMER MISSED ===\n")
@@ -829,107 +3289,129 @@ def handle_timer_ring(phone, voice, ring_audio):
     clear_timer()
 
 def play_farewell(voice, phone):
-    farewells = ["Thank you for calling. Goodbye!", "Thanks for calling!", "Goodbye, and have a great day!", "Thank you, goodbye!"]
-    farewell = random.choice(farewells)
-    farewell_audio = voice.text_to_speech(farewell, "farewell.wav")
-    voice.play_audio(farewell_audio, check_hangup=True, phone=phone)
-    os.remove(farewell_audio)
-
-def play_music_session(files, voice, phone):
-    if not files:
-        err = voice.text_to_speech("Sorry, no music files found.", "music_err.wav")
-        voice.play_audio(err, check_hangup=True, phone=phone)
-        os.remove(err)
+    voice.say(random.choice(FAREWELLS), phone)
+
+def play_soundboard_clip(voice, phone):
+    """Play the next soundboard clip, carrying on from the same spot on the speaker after a hangup"""
+    clip = soundboard.next()
+    if not clip:
+        voice.say("Sorry, no Simpsons clips found.", phone)
+        return
+    print(f"Clip: {os.path.basename(clip)}")
+    try:
+        pcm = soundboard.pcm(clip)
+    except Exception as e:
+        print(f"Clip decode error: {e}")
+        return
+    process = phone.hw.play_pcm(pcm, OUTPUT_RATE, "handset")
+    while process.poll() is None:
+        if phone.is_on_hook():
+            process.terminate()
+            process.wait(timeout=1)
+            print("Hung up - transferring to internal speaker")
+            remaining = pcm[process.frames_played * 2:]
+            process = phone.hw.play_pcm(remaining, OUTPUT_RATE, "internal", gain=get_internal_volume())
+            while process.poll() is None:
+                if phone.is_off_hook():
+                    process.terminate()
+                    print("Picked up - stopping internal audio")
+                    break
+                time.sleep(0.01)
+            return
+        time.sleep(0.01)
+
+def play_music_session(tracks, voice, phone):
+    if tracks.total == 0:
+        voice.say("Sorry, no music files found.", phone)
         return
     
-    random.shuffle(files)
-    file_index = 0
-    playing_internal = False
     vol = get_internal_volume()
     
-    intro = voice.text_to_speech(f"Playing {len(files)} songs on shuffle.", "music_intro.wav")
-    voice.play_audio(intro, check_hangup=True, phone=phone)
-    os.remove(intro)
+    if tracks.total is not None:
+        voice.prompts.say(["Playing"] + number_words(tracks.total) + ["songs on shuffle."], phone)
+    else:
+        voice.prompts.say(["Playing", "songs on shuffle."], phone)
     
-    while file_index < len(files):
-        current_file = files[file_index]
-        print(f"Now playing ({file_index + 1}/{len(files)}): {os.path.basename(current_file)}")
-        
-        if phone.is_off_hook() and not playing_internal:
-            if current_file.lower().endswith(('.mp3', '.mp4')):
-                process = subprocess.Popen(["mpg123", "-o", "alsa", "-q", "-a", HANDSET_DEVICE, current_file],
-                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            else:
-                process = subprocess.Popen(["aplay", "-D", HANDSET_DEVICE, current_file],
-                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Picked after the intro, so a folder walk has had time to fill the pool
+    current_file = tracks.next()
+    if current_file is None:
+        voice.say("Sorry, no music files found.", phone)
+        return
+    
+    # The next track is queued behind the current one on the same engine once
+    # the current decoder finishes, so it starts on the very next chunk. The
+    # hook loop only ever asks the shuffle for a track without waiting, so a
+    # slow folder walk can't hold up hangup detection
+    playing_internal = phone.is_on_hook()
+    output = ("internal", vol) if playing_internal else ("handset", 1.0)
+    track = MusicTrack(phone.hw, current_file)
+    upcoming = None
+    number = 0
+    try:
+        track.play(*output)
+        while track is not None:
+            number += 1
+            total = tracks.total if tracks.total is not None else f"{tracks.discovered}+"
+            print(f"Now playing ({number}/{total}): {os.path.basename(track.filename)}")
             
-            while process.poll() is None:
-                if phone.is_on_hook():
-                    process.terminate()
+            while track.poll() is None or (upcoming is None and not tracks.done()):
+                if upcoming is None and track.decoded.is_set():
+                    next_file = tracks.next(timeout=0)
+                    if next_file is not None:
+                        upcoming = MusicTrack(phone.hw, next_file)
+                        upcoming.play(*output)
+                
+                if not playing_internal and phone.is_on_hook():
                     print("Hung up - transferring to internal speaker")
                     playing_internal = True
-                    break
-                time.sleep(0.05)
+                    output = ("internal", vol)
+                    # Cancel the queued next track too, so the handset engine
+                    # doesn't start it in between the two moves
+                    phone.hw.engine("handset").cancel_all()
+                    if track.poll() is None:
+                        track.move(*output)
+                    if upcoming:
+                        upcoming.move(*output)
+                elif playing_internal and phone.is_off_hook():
+                    print("Picked up - stopping music")
+                    return
+                time.sleep(0.01)
             
-            if not playing_internal:
-                file_index += 1
-                continue
+            track.close()
+            track, upcoming = upcoming, None
         
-        if playing_internal or phone.is_on_hook():
-            playing_internal = True
-            temp_wav = "/tmp/music_temp.wav"
-            temp_loud = "/tmp/music_loud.wav"
-            
-            try:
-                if current_file.lower().endswith(('.mp3', '.mp4')):
-                    subprocess.run(["mpg123", "-q", "-w", temp_wav, current_file], check=True)
-                else:
-                    temp_wav = current_file
-                
-                subprocess.run(["sox", temp_wav, temp_loud, "vol", str(vol)], check=True)
-                
-                process = subprocess.Popen(["aplay", "-D", INTERNAL_DEVICE, temp_loud],
-                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                
-                while process.poll() is None:
-                    if phone.is_off_hook():
-                        process.terminate()
-                        print("Picked up - stopping music")
-                        try:
-                            if temp_wav != current_file:
-                                os.remove(temp_wav)
-                            os.remove(temp_loud)
-                        except:
-                            pass
-                        return
-                    time.sleep(0.05)
-                
-                try:
-                    if temp_wav != current_file:
-                        os.remove(temp_wav)
-                    os.remove(temp_loud)
-                except:
-                    pass
-                    
-            except Exception as e:
-                print(f"Music playback error: {e}")
-            
-            file_index += 1
-    
-    print("Playlist finished")
+        print("Playlist finished")
+    except Exception as e:
+        print(f"Music playback error: {e}")
+    finally:
+        for pending in (track, upcoming):
+            if pending:
+                pending.close()
+        tracks.close()
 
 def main():
-    phone = RotaryPhone()
-    voice = VoiceHandler()
-    llm = LLMHandler(LLM_API_URL, LLM_MODEL)
+    hw = create_hardware()
+    phone = RotaryPhone(hw)
+    voice = VoiceHandler(hw)
+    voice.prewarm(STATIC_PROMPTS)
+    voice.prompts.prewarm(PROMPT_PHRASES + NUMBER_WORDS + TENS_WORDS[2:] + ["hundred", "thousand"])
+    music_library.start()
+    llm = LLMHandler(LLM_API_URL, LLM_MODEL, LLM_CHAT_URL if LLM_CHAT_MODE else None)
+    llm.start_keepalive()
     offhook_audio = find_offhook_audio()
     ring_audio = find_ring_audio()
+    asset_cache.prerender([(ring_audio, "internal"), (offhook_audio, "handset")])
+    soundboard.start()
     
     print("Rotary Phone LLM Interface Ready!")
     print("=" * 40)
     print("NEW: Voice Activity Detection enabled!")
     print("Recording stops automatically when you")
-    print("stop talking (after 1.5s of silence)")
+    if ENDPOINT_ADAPTIVE:
+        print(f"stop talking (after {ENDPOINT_MIN_SILENCE}-{ENDPOINT_MAX_SILENCE}s")
+        print("of silence, learned per caller)")
+    else:
+        print(f"stop talking (after {ENDPOINT_MAX_SILENCE}s of silence)")
     print("=" * 40)
     print("Dial 0 for directory")
     print("Dial 411 for AI assistant")
@@ -945,21 +3427,17 @@ def main():
     print("Dial 555-DATE (5553283) for this day in history")
     
     time.sleep(3)
-    phone.pulse_count = 0
-    phone.dialed_number = ""
-    phone.last_state = GPIO.input(ROTARY_PIN)
+    phone.clear_events()
     
     try:
         while True:
             print("\n--- Phone idle. Waiting for pickup... ---")
-            phone.wait_for_pickup()
+            phone.wait_for_pickup(on_lift=llm.warm)
             
-            phone.pulse_count = 0
-            phone.dialed_number = ""
             time.sleep(0.5)
             
             while phone.is_off_hook():
-                if offhook_audio and not phone.offhook_process:
+                if not phone.offhook_process:
                     phone.play_offhook_tone(offhook_audio)
                 
                 number = phone.get_dialed_number()
@@ -986,77 +3464,43 @@ def main():
                 
                 elif number == "742":
                     print("\n=== SIMPSONS SOUNDBOARD ===")
-                    clip = get_random_simpsons_clip()
-                    if clip:
-                        if clip.lower().endswith('.mp3'):
-                            process = subprocess.Popen(["mpg123", "-o", "alsa", "-q", "-a", HANDSET_DEVICE, clip],
-                                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                            while process.poll() is None:
-                                if phone.is_on_hook():
-                                    process.terminate()
-                                    print("Hung up - transferring to internal speaker")
-                                    voice.play_on_internal(clip, phone)
-                                    break
-                                time.sleep(0.05)
-                        else:
-                            if not voice.play_audio(clip, check_hangup=True, phone=phone):
-                                voice.play_on_internal(clip, phone)
-                    else:
-                        err = voice.text_to_speech("Sorry, no Simpsons clips found.", "err.wav")
-                        voice.play_audio(err, check_hangup=True, phone=phone)
-                        os.remove(err)
+                    play_soundboard_clip(voice, phone)
                     if phone.is_off_hook():
                         play_farewell(voice, phone)
                     handled = True
                 
                 elif number == "5551212":
                     print("\n=== WEATHER SERVICE ===")
-                    intro = voice.text_to_speech("Checking the current weather for Knox, Indiana.", "w1.wav")
-                    voice.play_audio(intro, check_hangup=True, phone=phone)
-                    os.remove(intro)
+                    voice.say("Checking the current weather for Knox, Indiana.", phone)
                     if phone.is_off_hook():
-                        weather = voice.text_to_speech(get_weather(), "w2.wav")
-                        voice.play_audio(weather, check_hangup=True, phone=phone)
-                        os.remove(weather)
+                        voice.say(get_weather(), phone, cache=False)
                     if phone.is_off_hook():
                         play_farewell(voice, phone)
                     handled = True
                 
                 elif number == "5553653":
                     print("\n=== JOKE HOTLINE ===")
-                    intro = voice.text_to_speech("Here's a dad joke for you.", "j1.wav")
-                    voice.play_audio(intro, check_hangup=True, phone=phone)
-                    os.remove(intro)
+                    voice.say("Here's a dad joke for you.", phone)
                     if phone.is_off_hook():
-                        joke = voice.text_to_speech(get_dad_joke(), "j2.wav")
-                        voice.play_audio(joke, check_hangup=True, phone=phone)
-                        os.remove(joke)
+                        voice.say(get_dad_joke(), phone, cache=False)
                     if phone.is_off_hook():
                         play_farewell(voice, phone)
                     handled = True
                 
                 elif number == "5553228":
                     print("\n=== FACTS LINE ===")
-                    intro = voice.text_to_speech("Here's a random fact for you.", "f1.wav")
-                    voice.play_audio(intro, check_hangup=True, phone=phone)
-                    os.remove(intro)
+                    voice.say("Here's a random fact for you.", phone)
                     if phone.is_off_hook():
-                        fact = voice.text_to_speech(get_random_fact(), "f2.wav")
-                        voice.play_audio(fact, check_hangup=True, phone=phone)
-                        os.remove(fact)
+                        voice.say(get_random_fact(), phone, cache=False)
                     if phone.is_off_hook():
                         play_farewell(voice, phone)
                     handled = True
                 
                 elif number == "5553283":
                     print("\n=== HISTORY LINE ===")
-                    intro = voice.text_to_speech("Here's what happened on this day in history.", "h1.wav")
-                    voice.play_audio(intro, check_hangup=True, phone=phone)
-                    os.remove(intro)
+                    voice.say("Here's what happened on this day in history.", phone)
                     if phone.is_off_hook():
-                        history = voice.text_to_speech(get_this_day_in_history(), "h2.wav")
-                        voice.play_audio(history, check_hangup=True, phone=phone)
-                        os.remove(history)
+                        voice.say(get_this_day_in_history(), phone, cache=False)
                     if phone.is_off_hook():
                         play_farewell(voice, phone)
                     handled = True
@@ -1065,35 +3509,17 @@ def main():
                     print("\n=== VOLUME CONTROL ===")
                     current = get_internal_volume()
                     prompt = f"Internal speaker volume. Currently set to {current}x. Dial 1 for normal, 2 for double, 3 for triple."
-                    prompt_audio = voice.text_to_speech(prompt, "vol_prompt.wav")
-                    voice.play_audio(prompt_audio, check_hangup=True, phone=phone)
-                    os.remove(prompt_audio)
+                    voice.say(prompt, phone)
                     
                     if phone.is_off_hook():
-                        phone.dialed_number = ""
-                        phone.pulse_count = 0
-                        start_time = time.time()
-                        vol_digit = None
-                        
-                        while time.time() - start_time < 10 and phone.is_off_hook():
-                            phone.detect_pulse()
-                            if phone.dialed_number:
-                                vol_digit = phone.dialed_number
-                                phone.dialed_number = ""
-                                break
-                            time.sleep(0.01)
+                        vol_digit = phone.get_dialed_number(max_wait=10, max_digits=1)
                         
                         if vol_digit in ["1", "2", "3"]:
                             vol_map = {"1": 1.0, "2": 2.0, "3": 3.0}
                             set_internal_volume(vol_map[vol_digit])
-                            confirm = f"Volume set to {vol_digit}x."
-                            confirm_audio = voice.text_to_speech(confirm, "vol_confirm.wav")
-                            voice.play_audio(confirm_audio, check_hangup=True, phone=phone)
-                            os.remove(confirm_audio)
+                            voice.prompts.say(["Volume set to", NUMBER_WORDS[int(vol_digit)], "x."], phone)
                         else:
-                            err = voice.text_to_speech("No valid selection. Volume unchanged.", "vol_err.wav")
-                            voice.play_audio(err, check_hangup=True, phone=phone)
-                            os.remove(err)
+                            voice.say("No valid selection. Volume unchanged.", phone)
                     
                     if phone.is_off_hook():
                         play_farewell(voice, phone)
@@ -1102,46 +3528,24 @@ def main():
                 elif number == "846":
                     print("\n=== TIMER ===")
                     prompt = "Set a timer. Dial the number of minutes, then wait."
-                    prompt_audio = voice.text_to_speech(prompt, "timer_prompt.wav")
-                    voice.play_audio(prompt_audio, check_hangup=True, phone=phone)
-                    os.remove(prompt_audio)
+                    voice.say(prompt, phone)
                     
                     if phone.is_off_hook():
-                        phone.dialed_number = ""
-                        phone.pulse_count = 0
-                        start_time = time.time()
+                        timer_number = phone.get_dialed_number(max_wait=10)
                         
-                        while time.time() - start_time < 10 and phone.is_off_hook():
-                            phone.detect_pulse()
-                            if phone.dialed_number:
-                                start_time = time.time()
-                            if phone.dialed_number and (time.time() - phone.last_change_time) > 2:
-                                break
-                            time.sleep(0.01)
-                        
-                        if phone.dialed_number:
+                        if timer_number:
                             try:
-                                minutes = int(phone.dialed_number)
+                                minutes = int(timer_number)
                                 if 1 <= minutes <= 99:
                                     set_timer(minutes)
-                                    confirm = f"Timer set for {minutes} minute{'s' if minutes > 1 else ''}."
-                                    confirm_audio = voice.text_to_speech(confirm, "timer_confirm.wav")
-                                    voice.play_audio(confirm_audio, check_hangup=True, phone=phone)
-                                    os.remove(confirm_audio)
+                                    voice.prompts.say(["Timer set for"] + number_words(minutes) +
+                                                      ["minutes." if minutes > 1 else "minute."], phone)
                                 else:
-                                    err = voice.text_to_speech("Please enter a number between 1 and 99.", "timer_err.wav")
-                                    voice.play_audio(err, check_hangup=True, phone=phone)
-                                    os.remove(err)
+                                    voice.say("Please enter a number between 1 and 99.", phone)
                             except:
-                                err = voice.text_to_speech("Invalid number. Timer not set.", "timer_err.wav")
-                                voice.play_audio(err, check_hangup=True, phone=phone)
-                                os.remove(err)
+                                voice.say("Invalid number. Timer not set.", phone)
                         else:
-                            err = voice.text_to_speech("No number entered. Timer not set.", "timer_err.wav")
-                            voice.play_audio(err, check_hangup=True, phone=phone)
-                            os.remove(err)
-                        
-                        phone.dialed_number = ""
+                            voice.say("No number entered. Timer not set.", phone)
                     
                     if phone.is_off_hook():
                         play_farewell(voice, phone)
@@ -1149,66 +3553,58 @@ def main():
                 
                 elif number in MUSIC_FOLDERS:
                     print(f"\n=== MUSIC: {number} ===")
-                    files = get_music_files(number)
-                    play_music_session(files, voice, phone)
+                    play_music_session(music_library.shuffle(number), voice, phone)
                     handled = True
                 
                 elif number == "411":
                     print("\n=== CALL CONNECTED ===")
                     llm.reset_conversation()
+                    voice.start_capture()
                     
                     # Updated instruction - no more 15 second limit!
-                    inst = voice.text_to_speech(
-                        "Speak naturally. I will respond when you pause.",
-                        "inst.wav"
-                    )
-                    voice.play_audio(inst, check_hangup=True, phone=phone)
-                    os.remove(inst)
+                    voice.say("Speak naturally. I will respond when you pause.", phone)
                     
                     if phone.is_off_hook():
                         time.sleep(0.5)
-                        greet = voice.text_to_speech("Hello! I'm your AI assistant. How can I help?", "greet.wav")
-                        voice.play_audio(greet, check_hangup=True, phone=phone)
-                        os.remove(greet)
+                        voice.say("Hello! I'm your AI assistant. How can I help?", phone)
                     
+                    speculation = SpeculativeReply(voice, llm) if LLM_STREAMING and LLM_SPECULATE else None
                     turn = 0
                     while turn < 20 and phone.is_off_hook():
                         turn += 1
                         # VAD-enabled recording - stops when you stop talking
-                        audio_file = voice.record_audio(max_seconds=30, phone=phone)
-                        if not audio_file:
+                        user_msg = voice.listen(max_seconds=30, phone=phone, speculation=speculation)
+                        if user_msg is None:
                             break
                         
-                        user_msg = voice.transcribe_audio(audio_file)
                         print(f"You said: {user_msg}")
+                        reply = speculation.take(user_msg) if speculation else None
                         
                         if any(kw in user_msg.lower() for kw in ["goodbye", "bye", "hang up", "end call"]):
-                            bye = voice.text_to_speech("Goodbye! Call again anytime.", "bye.wav")
-                            voice.play_audio(bye, check_hangup=True, phone=phone)
-                            os.remove(bye)
-                            os.remove(audio_file)
+                            if reply:
+                                reply.cancel()
+                            voice.say("Goodbye! Call again anytime.", phone)
                             break
                         
                         if user_msg and "couldn't understand" not in user_msg:
-                            resp = llm.send_message(user_msg)
-                            resp_audio = voice.text_to_speech(resp)
-                            voice.play_audio(resp_audio, check_hangup=True, phone=phone)
-                            os.remove(resp_audio)
+                            if LLM_STREAMING:
+                                speak_llm_response(voice, llm, user_msg, phone, reply)
+                            else:
+                                resp = llm.send_message(user_msg)
+                                voice.say(resp, phone, cache=False)
                         else:
-                            retry = voice.text_to_speech("Sorry, I didn't catch that. Could you repeat?", "retry.wav")
-                            voice.play_audio(retry, check_hangup=True, phone=phone)
-                            os.remove(retry)
-                        os.remove(audio_file)
+                            voice.say("Sorry, I didn't catch that. Could you repeat?", phone)
                     
+                    voice.stop_capture()
                     voice.play_tone(600, 0.5)
+                    http_client.print_stats()
+                    hw.print_audio_stats()
                     handled = True
                 
                 if not handled:
                     print(f"Number {number} is not configured.")
-                    err_msg = f"The number you dialed, {' '.join(str(number))}, is not in service. Dial 0 for a directory."
-                    err = voice.text_to_speech(err_msg, "error.wav")
-                    voice.play_audio(err, check_hangup=True, phone=phone)
-                    os.remove(err)
+                    voice.prompts.say(["The number you dialed,", 0.15] + digit_words(number) +
+                                      [0.15, "is not in service. Dial 0 for a directory."], phone)
                 
                 time.sleep(0.3)
                 if phone.is_on_hook():
@@ -1226,8 +3622,197 @@ def main():
         phone.stop_offhook_tone()
     finally:
         phone.stop_offhook_tone()
-        voice.cleanup()
-        GPIO.cleanup()
+        voice.stop_capture()
+        hw.print_audio_stats()
+        llm.print_warm_stats()
+        phone.cleanup()
+        hw.cleanup()
+
+class StalledDecoder(PulseDecoder):
+    """PulseDecoder whose thread is held up for stall seconds every time it wakes, as on a loaded Pi"""
+    def __init__(self, hw, stall):
+        self.stall = stall
+        super().__init__(hw)
+    
+    def _next_deadline(self):
+        time.sleep(self.stall)
+        return super()._next_deadline()
+
+def run_dial_benchmark(trials=20, seed=1, stall=0.0):
+    """
+    Replay random dialed numbers (with bounce, jitter and glitches) through the
+    simulated phone and report decode accuracy, digit latency and hangup latency.
+    With stall, the decoder thread only runs every stall seconds, so edges pile
+    up in its queue between wake-ups.
+    """
+    if stall:
+        print(f"Decoder thread held up {stall * 1000:.0f} ms per wake-up:")
+    rng = random.Random(seed)
+    correct = 0
+    digit_latencies = []
+    hangup_latencies = []
+    for trial in range(trials):
+        number = "".join(rng.choice("0123456789") for _ in range(rng.randint(1, 7)))
+        script = PhoneScript(seed=rng.randrange(1 << 30))
+        script.pickup(0.1)
+        end = script.dial(number, 0.3)
+        script.glitch(end)
+        hangup_at = script.hangup(end + 0.5)
+        hw = SimulatedHardware()
+        decoder = StalledDecoder(hw, stall) if stall else PulseDecoder(hw)
+        start = hw.replay(script)
+        digits = []
+        while True:
+            event = decoder.next_event(timeout=hangup_at + 2.0)
+            if event is None:
+                break
+            received = time.monotonic() - start
+            kind, value, t = event
+            if kind == "digit":
+                digits.append((value, received))
+            elif kind == "hook" and not value:
+                hangup_latencies.append(received - hangup_at)
+                break
+        decoder.stop()
+        hw.cleanup()
+        dialed = "".join(d for d, _ in digits)
+        truth = [(v, off) for kind, v, off in script.truth if kind == "digit"]
+        if dialed == number:
+            correct += 1
+            digit_latencies += [received - off for (_, received), (_, off) in zip(digits, truth)]
+        else:
+            print(f"  Trial {trial}: dialed {number}, decoded {dialed}")
+    print(f"Dial decode accuracy: {correct}/{trials}")
+    for name, values in [("Digit decode latency", digit_latencies), ("Hangup latency", hangup_latencies)]:
+        if values:
+            values.sort()
+            print(f"{name}: median {values[len(values) // 2] * 1000:.1f} ms, "
+                  f"max {values[-1] * 1000:.1f} ms")
+
+def run_hangup_benchmark(trials=10, seed=1):
+    """Measure how long a handset clip keeps playing after the simulated hangup"""
+    clip = os.path.join(SIM_OUTPUT_DIR, "bench_clip.wav")
+    os.makedirs(SIM_OUTPUT_DIR, exist_ok=True)
+    with wave.open(clip, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(RECORD_RATE)
+        wf.writeframes(b"\x00\x00" * RECORD_RATE * 3)
+    rng = random.Random(seed)
+    latencies = []
+    for trial in range(trials):
+        script = PhoneScript(seed=trial)
+        script.pickup(0.0)
+        hangup_at = script.hangup(rng.uniform(0.5, 1.5))
+        hw = SimulatedHardware()
+        phone = RotaryPhone(hw)
+        voice = VoiceHandler(hw)
+        start = hw.replay(script)
+        time.sleep(0.1)
+        voice.play_audio(clip, check_hangup=True, phone=phone)
+        latencies.append(time.monotonic() - start - hangup_at)
+        phone.cleanup()
+        hw.cleanup()
+    latencies.sort()
+    print(f"Playback hangup reaction: median {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"max {latencies[-1] * 1000:.1f} ms")
+
+def run_vad_benchmark(frames=2000, seed=1):
+    """
+    CPU time per 30 ms frame of the recording path (resample, VAD, RMS) on
+    noisy synthetic speech, plus how well the resampler rejects a 10 kHz tone
+    that plain decimation would fold down to 6 kHz.
+    """
+    frame_size = RECORD_RATE * 30 // 1000
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames * frame_size) / RECORD_RATE
+    signal = 4000 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 2 * t) > 0) + rng.normal(0, 300, len(t))
+    pcm = np.clip(signal, -32768, 32767).astype(np.int16).tobytes()
+    chunks = [pcm[i * frame_size * 2:(i + 1) * frame_size * 2] for i in range(frames)]
+    front = VadFrontEnd(RECORD_RATE, 16000)
+    vad = webrtcvad.Vad(2)
+    
+    start = time.process_time()
+    resampled = [front.resample(chunk) for chunk in chunks]
+    resample_time = time.process_time() - start
+    start = time.process_time()
+    for chunk in resampled:
+        vad.is_speech(chunk, 16000)
+    vad_time = time.process_time() - start
+    start = time.process_time()
+    for chunk in chunks:
+        front.rms(chunk)
+    rms_time = time.process_time() - start
+    
+    for name, total in [("Resample 48k->16k", resample_time), ("webrtcvad", vad_time), ("RMS", rms_time)]:
+        print(f"{name}: {total / frames * 1e6:.1f} us CPU per frame")
+    
+    tone = (8000 * np.sin(2 * np.pi * 10000 * np.arange(RECORD_RATE) / RECORD_RATE)).astype(np.int16)
+    front.reset()
+    filtered = np.frombuffer(b"".join(front.resample(tone[i:i + frame_size].tobytes())
+                                      for i in range(0, len(tone) - frame_size + 1, frame_size)), dtype=np.int16)
+    rejection = 20 * math.log10(VadFrontEnd.rms(tone[::3].tobytes()) / max(VadFrontEnd.rms(filtered[len(filtered) // 2:].tobytes()), 1e-3))
+    print(f"10 kHz alias rejection vs plain decimation: {rejection:.1f} dB")
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance divided by the reference length"""
+    ref = re.sub(r"[^a-z0-9' ]", " ", reference.lower()).split()
+    hyp = re.sub(r"[^a-z0-9' ]", " ", hypothesis.lower()).split()
+    row = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (ref_word != hyp_word))
+    return row[-1] / max(len(ref), 1)
+
+def run_stt_benchmark(fixture_dir=STT_FIXTURE_DIR, engines=("vosk", "google")):
+    """
+    Transcribe every <name>.wav in fixture_dir that has a <name>.txt reference
+    with each engine and report latency, real-time factor and word error rate.
+    """
+    fixtures = []
+    for name in sorted(os.listdir(fixture_dir)):
+        base, ext = os.path.splitext(name)
+        reference = os.path.join(fixture_dir, base + ".txt")
+        if ext.lower() == ".wav" and os.path.exists(reference):
+            with sr.AudioFile(os.path.join(fixture_dir, name)) as source:
+                audio = sr.Recognizer().record(source)
+            with open(reference, 'r') as f:
+                fixtures.append((name, audio, f.read().strip()))
+    if not fixtures:
+        print(f"No .wav/.txt fixture pairs in {fixture_dir}")
+        return
+    audio_seconds = sum(len(audio.frame_data) / audio.sample_width / audio.sample_rate for _, audio, _ in fixtures)
+    for engine_name in engines:
+        engine = create_stt_engine(engine_name)
+        if engine.name != engine_name:
+            continue
+        latencies = []
+        errors = []
+        for name, audio, reference in fixtures:
+            start = time.monotonic()
+            try:
+                text = engine.transcribe(audio)
+            except sr.UnknownValueError:
+                text = ""
+            except sr.RequestError as e:
+                print(f"  {engine_name} failed on {name}: {e}")
+                text = ""
+            latencies.append(time.monotonic() - start)
+            errors.append(word_error_rate(reference, text))
+        latencies.sort()
+        print(f"{engine_name}: median {latencies[len(latencies) // 2]:.2f}s, max {latencies[-1]:.2f}s, "
+              f"RTF {sum(latencies) / audio_seconds:.2f}, WER {sum(errors) / len(errors) * 100:.1f}% "
+              f"over {len(fixtures)} clips")
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench-dial":
+        run_dial_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 20)
+        run_dial_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 20, stall=0.12)
+        run_hangup_benchmark()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--bench-vad":
+        run_vad_benchmark()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--bench-stt":
+        run_stt_benchmark(sys.argv[2] if len(sys.argv) > 2 else STT_FIXTURE_DIR)
+    else:
+        main()